@@ -5,12 +5,17 @@ import os
 import streamlit as st
 
 from db.seed import seed as seed_db  # ✅ 注意这里
+from lib import db
 
 @st.cache_resource
 def _bootstrap_db():
     if os.getenv("SMART_FRIDGE_SKIP_SEED") == "1":
         return "skip"
     seed_db()
+    # 每个进程启动时校验一次看板计数器，漂移则从基表重建
+    db.check_kpi_counters()
+    # 已消耗/丢弃且超过宽限期的批次移入归档表，保持热表只含在库数据
+    db.archive_finished_batches()
     return "ok"
 
 _bootstrap_db()
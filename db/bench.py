@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+import argparse
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from lib import api, backup, db
+
+
+# =========================
+# Micro-benchmarks for lib/db.py
+# - runs against a throwaway database, never data/smart_fridge.db
+# - usage: python db/bench.py [pool] [--calls N]
+# =========================
+
+
+def _unpooled_fetch_one(query: str, params=()):
+    """The pre-pool code path: a fresh connection and PRAGMA per call."""
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON")
+    try:
+        row = conn.execute(query, params).fetchone()
+        return dict(row) if row else None
+    finally:
+        conn.close()
+
+
+def _rate(fn, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return calls / (time.perf_counter() - start)
+
+
+def bench_pool(calls: int) -> None:
+    query = "SELECT * FROM items WHERE item_id = ?"
+    before = _rate(lambda: _unpooled_fetch_one(query, (1,)), calls)
+    after = _rate(lambda: db.fetch_one(query, (1,)), calls)
+    print(f"[pool] fetch_one x{calls}")
+    print(f"  per-call connect : {before:10.0f} calls/s")
+    print(f"  pooled           : {after:10.0f} calls/s  ({after / before:.1f}x)")
+
+
+def _sample_batch(i: int) -> dict:
+    return {
+        "batch_id": f"bench_{time.perf_counter_ns()}_{i}",
+        "item_name_snapshot": f"item_{i % 200}",
+        "quantity": 1.0,
+        "unit": "g",
+        "created_at": db.now_ts(),
+        "updated_at": db.now_ts(),
+    }
+
+
+def _sample_event(batch: dict) -> dict:
+    return {
+        "event_id": f"evt_{batch['batch_id']}",
+        "batch_id": batch["batch_id"],
+        "event_type": "create",
+        "created_at": db.now_ts(),
+    }
+
+
+def bench_ingest(calls: int) -> None:
+    photos = max(1, calls // 200)
+    items_per_photo = 40
+
+    def per_row() -> None:
+        for i in range(items_per_photo):
+            batch = _sample_batch(i)
+            db.insert_batch(batch)
+            db.insert_event(_sample_event(batch))
+
+    def grouped() -> None:
+        with db.unit_of_work() as uow:
+            for i in range(items_per_photo):
+                batch = _sample_batch(i)
+                uow.add_batch(batch)
+                uow.add_event(_sample_event(batch))
+
+    before = _rate(per_row, photos)
+    after = _rate(grouped, photos)
+    print(f"[ingest] {items_per_photo}-item photos x{photos}")
+    print(f"  commit per row   : {before:10.1f} photos/s")
+    print(f"  unit_of_work     : {after:10.1f} photos/s  ({after / before:.1f}x)")
+
+
+def _peak_kib(fn) -> float:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def bench_stream(calls: int) -> None:
+    rows = calls * 4
+    with db.unit_of_work() as uow:
+        for i in range(rows):
+            uow.add_batch(_sample_batch(i))
+    query = "SELECT * FROM inventory_batches"
+
+    def materialized() -> None:
+        for _ in db.fetch_all(query):
+            pass
+
+    def streamed() -> None:
+        for _ in db.iter_rows(query):
+            pass
+
+    print(f"[stream] iterate {db.count_rows('inventory_batches')} batches once")
+    print(f"  fetch_all peak   : {_peak_kib(materialized):10.0f} KiB")
+    print(f"  iter_rows peak   : {_peak_kib(streamed):10.0f} KiB")
+
+
+def _retained_kib(fn) -> float:
+    """KiB still allocated while fn's result is alive."""
+    tracemalloc.start()
+    try:
+        result = fn()
+        retained = tracemalloc.get_traced_memory()[0] / 1024
+        del result
+        return retained
+    finally:
+        tracemalloc.stop()
+
+
+def _seconds(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def bench_records(calls: int) -> None:
+    rows = 100_000
+    missing = rows - db.count_rows("inventory_batches")
+    if missing > 0:
+        with db.unit_of_work() as uow:
+            for i in range(missing):
+                uow.add_batch(_sample_batch(i))
+    as_dicts = lambda: db.list_batches({}, limit=rows)  # noqa: E731
+    as_records = lambda: list(db.iter_batch_records({}, limit=rows))  # noqa: E731
+    print(f"[records] materialize {rows} batches")
+    print(f"  dict rows        : {_retained_kib(as_dicts) / 1024:8.1f} MiB  {_seconds(as_dicts):6.2f} s")
+    print(f"  batch records    : {_retained_kib(as_records) / 1024:8.1f} MiB  {_seconds(as_records):6.2f} s")
+
+
+def bench_writers(calls: int) -> None:
+    sessions = 16
+    writes = max(1, calls // (sessions * 10))
+
+    def run(write_queue: bool) -> tuple:
+        db.WRITE_QUEUE = write_queue
+        errors = []
+
+        def session() -> None:
+            for i in range(writes):
+                try:
+                    with db.unit_of_work() as uow:
+                        batch = _sample_batch(i)
+                        uow.add_batch(batch)
+                        uow.add_event(_sample_event(batch))
+                except sqlite3.OperationalError as exc:
+                    errors.append(exc)
+
+        threads = [threading.Thread(target=session) for _ in range(sessions)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sessions * writes / (time.perf_counter() - start), len(errors)
+
+    direct, direct_errors = run(False)
+    queued, queued_errors = run(True)
+    print(f"[writers] {sessions} sessions x {writes} writes")
+    print(f"  per-thread writes: {direct:10.1f} writes/s  {direct_errors} lock errors")
+    print(f"  write queue      : {queued:10.1f} writes/s  {queued_errors} lock errors  ({queued / direct:.1f}x)")
+
+
+def bench_cache(calls: int) -> None:
+    missing = 2000 - db.count_rows("inventory_batches")
+    if missing > 0:
+        with db.unit_of_work() as uow:
+            for i in range(missing):
+                uow.add_batch(_sample_batch(i))
+    # What the inventory page reads on every rerun with no keyword (pages/2_📦_库存.py).
+    page_filters = {"location": None, "status": None, "keyword": None}
+    page_columns = [
+        "batch_id", "item_name_snapshot", "quantity", "unit", "expire_date", "expire_day", "location", "status", "source_type"
+    ]
+    rerun = lambda: (  # noqa: E731
+        api.list_batches_page(page_filters, limit=60, columns=page_columns),
+        api.inventory_metrics(),
+    )
+    size = db.QUERY_CACHE_SIZE
+    db.QUERY_CACHE_SIZE = 0
+    before = _rate(rerun, calls // 10)
+    db.QUERY_CACHE_SIZE = size
+    after = _rate(rerun, calls // 10)
+    print(f"[cache] inventory page (first batch page + metrics), unchanged data x{calls // 10}")
+    print(f"  uncached         : {before:10.0f} reruns/s")
+    print(f"  query cache      : {after:10.0f} reruns/s  ({after / before:.1f}x)")
+
+
+def bench_backup(calls: int) -> None:
+    missing = 30_000 - db.count_rows("inventory_batches")
+    if missing > 0:
+        with db.unit_of_work() as uow:
+            for i in range(missing):
+                uow.add_batch(_sample_batch(i))
+    read_query = "SELECT * FROM inventory_batches WHERE batch_id = ?"
+    batch_id = db.fetch_one("SELECT batch_id FROM inventory_batches LIMIT 1")["batch_id"]
+
+    def under_load(task) -> tuple:
+        """Reads/s, writes/s and worst read latency (ms) while ``task`` runs."""
+        done = threading.Event()
+        reads, writes, worst = [0], [0], [0.0]
+
+        def reader() -> None:
+            while not done.is_set():
+                start = time.perf_counter()
+                db.fetch_one(read_query, (batch_id,))
+                worst[0] = max(worst[0], time.perf_counter() - start)
+                reads[0] += 1
+
+        def writer() -> None:
+            while not done.is_set():
+                with db.unit_of_work() as uow:
+                    uow.add_batch(_sample_batch(writes[0]))
+                writes[0] += 1
+
+        threads = [threading.Thread(target=reader), threading.Thread(target=writer)]
+        for thread in threads:
+            thread.start()
+        elapsed = _seconds(task)
+        done.set()
+        for thread in threads:
+            thread.join()
+        return reads[0] / elapsed, writes[0] / elapsed, worst[0] * 1000, elapsed
+
+    idle = under_load(lambda: time.sleep(1.0))
+    stepped = under_load(lambda: backup.create_backup(keep=1))
+    whole = under_load(lambda: backup.create_backup(keep=1, pages=-1, sleep=0))
+    print(f"[backup] snapshot {db.count_rows('inventory_batches')} batches under 1 reader + 1 writer")
+    for label, (reads, writes, worst, elapsed) in (
+        ("no backup", idle),
+        (f"{backup.BACKUP_PAGES}-page steps", stepped),
+        ("single step", whole),
+    ):
+        print(
+            f"  {label:<17}: {reads:8.0f} reads/s  {writes:7.1f} writes/s"
+            f"  worst read {worst:6.1f} ms  ({elapsed:.2f} s)"
+        )
+
+
+BENCHES = {
+    "backup": bench_backup,
+    "cache": bench_cache,
+    "ingest": bench_ingest,
+    "pool": bench_pool,
+    "records": bench_records,
+    "stream": bench_stream,
+    "writers": bench_writers,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark lib/db.py against a scratch database")
+    parser.add_argument("bench", nargs="*", help=f"benchmarks to run: {', '.join(sorted(BENCHES))} (default: all)")
+    parser.add_argument("--calls", type=int, default=5000)
+    args = parser.parse_args()
+    unknown = set(args.bench) - set(BENCHES)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = Path(tmp) / "bench.db"
+        db.init_db()
+        db.insert_items([{"name": f"item_{i}", "default_unit": "g"} for i in range(200)])
+        for name in args.bench or sorted(BENCHES):
+            BENCHES[name](args.calls)
+        db.close_all()
+
+
+if __name__ == "__main__":
+    main()
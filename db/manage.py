@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from lib import backup, bulk_io, db
+
+
+# =========================
+# Maintenance commands for data/smart_fridge.db
+# - usage: python db/manage.py <command> [options]
+# =========================
+
+
+def cmd_migrate(args: argparse.Namespace) -> None:
+    db.init_db()
+    print(f"Schema version: {db.schema_version()}")
+
+
+def cmd_check_kpis(args: argparse.Namespace) -> None:
+    db.init_db()
+    result = db.check_kpi_counters(repair=not args.dry_run)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+def cmd_rebuild_search(args: argparse.Namespace) -> None:
+    db.init_db()
+    print(f"Indexed {db.rebuild_search_index()} batches")
+
+
+def cmd_rebuild_totals(args: argparse.Namespace) -> None:
+    db.init_db()
+    print(f"Rebuilt {db.rebuild_inventory_totals()} inventory totals")
+
+
+def cmd_rollup_events(args: argparse.Namespace) -> None:
+    db.init_db()
+    result = db.rollup_events(args.days)
+    print(f"Archived {result['archived']} events created before {result['cutoff']}")
+
+
+def cmd_archive_batches(args: argparse.Namespace) -> None:
+    db.init_db()
+    requested = db.BATCH_ARCHIVE_DAYS if args.days is None else args.days
+    if requested < db.EVENT_RETENTION_DAYS:
+        print(
+            f"--days {requested} is below the event retention window ({db.EVENT_RETENTION_DAYS} days); "
+            f"using {db.EVENT_RETENTION_DAYS} so recent events stay in inventory_events",
+            file=sys.stderr,
+        )
+    result = db.archive_finished_batches(args.days)
+    print(f"Archived {result['batches']} batches and {result['events']} events last updated before {result['cutoff']}")
+
+
+def _progress(label: str):
+    def report(done: int, rejected: int) -> None:
+        print(f"\r{label}: {done} rows, {rejected} rejected", end="", file=sys.stderr, flush=True)
+
+    return report
+
+
+def _pages_progress(label: str):
+    def report(done: int, total: int) -> None:
+        print(f"\r{label}: {done}/{total} pages", end="", file=sys.stderr, flush=True)
+
+    return report
+
+
+def cmd_import(args: argparse.Namespace) -> None:
+    report = bulk_io.import_file(
+        args.table, Path(args.path), fmt=args.format, chunk_size=args.chunk_size, progress=_progress(args.table)
+    )
+    print(file=sys.stderr)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if report["rejected"]:
+        sys.exit(1)
+
+
+def cmd_export(args: argparse.Namespace) -> None:
+    written = bulk_io.export_file(
+        args.table,
+        Path(args.path),
+        fmt=args.format,
+        chunk_size=args.chunk_size,
+        progress=_progress(args.table),
+        include_archive=args.include_archive,
+    )
+    print(file=sys.stderr)
+    print(f"Exported {written} {args.table} rows to {args.path}")
+
+
+def cmd_backup(args: argparse.Namespace) -> None:
+    result = backup.create_backup(keep=args.keep, pages=args.pages, progress=_pages_progress("backup"))
+    print(file=sys.stderr)
+    print(f"Wrote {result['path']} ({result['pages']} pages, {result['seconds']} s); removed {len(result['removed'])} old snapshots")
+
+
+def cmd_list_backups(args: argparse.Namespace) -> None:
+    for snapshot in backup.list_backups():
+        print(f"{snapshot['created_at']}  {snapshot['size']:>12}  {snapshot['path']}")
+
+
+def cmd_restore(args: argparse.Namespace) -> None:
+    result = backup.restore(Path(args.snapshot), Path(args.target))
+    print(f"Restored {args.snapshot} into {result['path']} ({result['pages']} pages)")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Smart fridge database maintenance")
+    parser.add_argument("--household", default=None, help="operate on this household's database instead of the default one")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("migrate", help="apply pending schema migrations")
+    p.set_defaults(func=cmd_migrate)
+
+    p = sub.add_parser("check-kpis", help="recount dashboard KPI counters and rebuild them if they drifted")
+    p.add_argument("--dry-run", action="store_true", help="report mismatches without repairing")
+    p.set_defaults(func=cmd_check_kpis)
+
+    p = sub.add_parser("rebuild-search", help="repopulate the inventory keyword search index")
+    p.set_defaults(func=cmd_rebuild_search)
+
+    p = sub.add_parser("rebuild-totals", help="recompute per-item inventory totals used by the planners")
+    p.set_defaults(func=cmd_rebuild_totals)
+
+    p = sub.add_parser("rollup-events", help="roll up old inventory events into daily totals and archive them")
+    p.add_argument("--days", type=int, default=None, help=f"keep this many days of raw events (default {db.EVENT_RETENTION_DAYS})")
+    p.set_defaults(func=cmd_rollup_events)
+
+    p = sub.add_parser("archive-batches", help="move finished batches past the grace period to the archive table")
+    p.add_argument(
+        "--days",
+        type=int,
+        default=None,
+        help=(
+            f"grace period in days (default {db.BATCH_ARCHIVE_DAYS}); effective cutoff: last updated more than "
+            f"max(days, {db.EVENT_RETENTION_DAYS}) days ago (UTC), since events younger than the retention "
+            "window stay in inventory_events"
+        ),
+    )
+    p.set_defaults(func=cmd_archive_batches)
+
+    p = sub.add_parser("backup", help="snapshot the live database without stopping the app, verify it and rotate old snapshots")
+    p.add_argument("--keep", type=int, default=None, help=f"snapshots to keep (default {backup.BACKUP_KEEP})")
+    p.add_argument("--pages", type=int, default=None, help=f"pages copied per step, -1 for one step (default {backup.BACKUP_PAGES})")
+    p.set_defaults(func=cmd_backup)
+
+    p = sub.add_parser("list-backups", help="list snapshots of the database, newest first")
+    p.set_defaults(func=cmd_list_backups)
+
+    p = sub.add_parser("restore", help="copy a verified snapshot into a new database file (never overwrites)")
+    p.add_argument("snapshot", help="snapshot file written by the backup command")
+    p.add_argument("target", help="path of the new database file")
+    p.set_defaults(func=cmd_restore)
+
+    for name, func, help_text in (
+        ("import", cmd_import, "upsert rows from a CSV/JSONL file (streamed in chunks)"),
+        ("export", cmd_export, "stream a table to a CSV/JSONL file"),
+    ):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("table", choices=sorted(bulk_io.TABLES))
+        p.add_argument("path", help="file path; format is taken from the .csv/.jsonl suffix unless --format is given")
+        p.add_argument("--format", choices=["csv", "jsonl"], default=None)
+        p.add_argument("--chunk-size", type=int, default=bulk_io.CHUNK_SIZE, help="rows per transaction")
+        if name == "export":
+            p.add_argument(
+                "--include-archive",
+                action="store_true",
+                help="also export archived batches/events (without it those exports are partial)",
+            )
+        p.set_defaults(func=func)
+
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    with db.household(args.household):
+        args.func(args)
+
+
+if __name__ == "__main__":
+    main()
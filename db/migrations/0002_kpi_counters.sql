@@ -0,0 +1,78 @@
+-- Materialized KPI counters for api.dashboard_summary, kept current by triggers.
+
+CREATE TABLE IF NOT EXISTS kpi_counters (
+  name TEXT PRIMARY KEY,
+  value INTEGER NOT NULL DEFAULT 0
+);
+
+-- In-stock batches per expire_date; expiring KPIs sum a short range of dates.
+CREATE TABLE IF NOT EXISTS inventory_expiry_buckets (
+  expire_date TEXT PRIMARY KEY,
+  batch_count INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR REPLACE INTO kpi_counters(name, value)
+  SELECT 'in_stock_batches', COUNT(*) FROM inventory_batches WHERE status = 'in_stock';
+INSERT OR REPLACE INTO kpi_counters(name, value)
+  SELECT 'in_stock_no_expiry', COUNT(*) FROM inventory_batches WHERE status = 'in_stock' AND expire_date IS NULL;
+INSERT OR REPLACE INTO kpi_counters(name, value)
+  SELECT 'recipes', COUNT(*) FROM recipes;
+
+DELETE FROM inventory_expiry_buckets;
+INSERT INTO inventory_expiry_buckets(expire_date, batch_count)
+  SELECT expire_date, COUNT(*) FROM inventory_batches
+  WHERE status = 'in_stock' AND expire_date IS NOT NULL
+  GROUP BY expire_date;
+
+CREATE TRIGGER IF NOT EXISTS trg_kpi_batches_insert
+AFTER INSERT ON inventory_batches
+WHEN NEW.status = 'in_stock'
+BEGIN
+  UPDATE kpi_counters SET value = value + 1 WHERE name = 'in_stock_batches';
+  UPDATE kpi_counters SET value = value + 1 WHERE name = 'in_stock_no_expiry' AND NEW.expire_date IS NULL;
+  INSERT INTO inventory_expiry_buckets(expire_date, batch_count)
+    SELECT NEW.expire_date, 1 WHERE NEW.expire_date IS NOT NULL
+    ON CONFLICT(expire_date) DO UPDATE SET batch_count = batch_count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_kpi_batches_update
+AFTER UPDATE OF status, expire_date ON inventory_batches
+WHEN OLD.status = 'in_stock' OR NEW.status = 'in_stock'
+BEGIN
+  UPDATE kpi_counters
+    SET value = value - (OLD.status = 'in_stock') + (NEW.status = 'in_stock')
+    WHERE name = 'in_stock_batches';
+  UPDATE kpi_counters
+    SET value = value
+      - (OLD.status = 'in_stock' AND OLD.expire_date IS NULL)
+      + (NEW.status = 'in_stock' AND NEW.expire_date IS NULL)
+    WHERE name = 'in_stock_no_expiry';
+  UPDATE inventory_expiry_buckets SET batch_count = batch_count - 1
+    WHERE OLD.status = 'in_stock' AND expire_date = OLD.expire_date;
+  DELETE FROM inventory_expiry_buckets WHERE expire_date = OLD.expire_date AND batch_count <= 0;
+  INSERT INTO inventory_expiry_buckets(expire_date, batch_count)
+    SELECT NEW.expire_date, 1 WHERE NEW.status = 'in_stock' AND NEW.expire_date IS NOT NULL
+    ON CONFLICT(expire_date) DO UPDATE SET batch_count = batch_count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_kpi_batches_delete
+AFTER DELETE ON inventory_batches
+WHEN OLD.status = 'in_stock'
+BEGIN
+  UPDATE kpi_counters SET value = value - 1 WHERE name = 'in_stock_batches';
+  UPDATE kpi_counters SET value = value - 1 WHERE name = 'in_stock_no_expiry' AND OLD.expire_date IS NULL;
+  UPDATE inventory_expiry_buckets SET batch_count = batch_count - 1 WHERE expire_date = OLD.expire_date;
+  DELETE FROM inventory_expiry_buckets WHERE expire_date = OLD.expire_date AND batch_count <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_kpi_recipes_insert
+AFTER INSERT ON recipes
+BEGIN
+  UPDATE kpi_counters SET value = value + 1 WHERE name = 'recipes';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_kpi_recipes_delete
+AFTER DELETE ON recipes
+BEGIN
+  UPDATE kpi_counters SET value = value - 1 WHERE name = 'recipes';
+END;
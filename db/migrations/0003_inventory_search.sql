@@ -0,0 +1,71 @@
+-- Trigram full-text index over batch names and their catalogue item names.
+-- Each search row carries its batch_id (UNINDEXED, for joins). inventory_batches
+-- has a TEXT primary key, so VACUUM may renumber its rowids: instead of sharing
+-- them, inventory_search_rows maps batch_id to the FTS rowid (an INTEGER PRIMARY
+-- KEY survives VACUUM) and triggers find a batch's row through it without
+-- scanning the index.
+
+CREATE VIRTUAL TABLE IF NOT EXISTS inventory_search USING fts5(
+  batch_id UNINDEXED,
+  item_name_snapshot,
+  item_name,
+  tokenize = 'trigram'
+);
+
+CREATE TABLE IF NOT EXISTS inventory_search_rows (
+  search_rowid INTEGER PRIMARY KEY,
+  batch_id TEXT NOT NULL UNIQUE
+);
+
+DELETE FROM inventory_search;
+DELETE FROM inventory_search_rows;
+INSERT INTO inventory_search_rows(batch_id) SELECT batch_id FROM inventory_batches;
+INSERT INTO inventory_search(rowid, batch_id, item_name_snapshot, item_name)
+  SELECT r.search_rowid, b.batch_id, b.item_name_snapshot, COALESCE(i.name, '')
+  FROM inventory_search_rows r
+  JOIN inventory_batches b ON b.batch_id = r.batch_id
+  LEFT JOIN items i ON i.item_id = b.item_id;
+
+CREATE TRIGGER IF NOT EXISTS trg_inventory_search_insert
+AFTER INSERT ON inventory_batches
+BEGIN
+  INSERT INTO inventory_search_rows(batch_id) VALUES (NEW.batch_id);
+  INSERT INTO inventory_search(rowid, batch_id, item_name_snapshot, item_name)
+    VALUES (
+      (SELECT search_rowid FROM inventory_search_rows WHERE batch_id = NEW.batch_id),
+      NEW.batch_id,
+      NEW.item_name_snapshot,
+      COALESCE((SELECT name FROM items WHERE item_id = NEW.item_id), '')
+    );
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_inventory_search_update
+AFTER UPDATE OF batch_id, item_name_snapshot, item_id ON inventory_batches
+BEGIN
+  UPDATE inventory_search_rows SET batch_id = NEW.batch_id WHERE batch_id = OLD.batch_id;
+  UPDATE inventory_search
+    SET batch_id = NEW.batch_id,
+        item_name_snapshot = NEW.item_name_snapshot,
+        item_name = COALESCE((SELECT name FROM items WHERE item_id = NEW.item_id), '')
+    WHERE rowid = (SELECT search_rowid FROM inventory_search_rows WHERE batch_id = NEW.batch_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_inventory_search_delete
+AFTER DELETE ON inventory_batches
+BEGIN
+  DELETE FROM inventory_search
+    WHERE rowid = (SELECT search_rowid FROM inventory_search_rows WHERE batch_id = OLD.batch_id);
+  DELETE FROM inventory_search_rows WHERE batch_id = OLD.batch_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_inventory_search_item_rename
+AFTER UPDATE OF name ON items
+BEGIN
+  UPDATE inventory_search SET item_name = NEW.name
+    WHERE rowid IN (
+      SELECT r.search_rowid
+      FROM inventory_batches b
+      JOIN inventory_search_rows r ON r.batch_id = b.batch_id
+      WHERE b.item_id = NEW.item_id
+    );
+END;
@@ -0,0 +1,16 @@
+-- Indexes behind keyset pagination: every page is a range scan on
+-- (expire_date, batch_id) for batches and (created_at, event_id) for events.
+
+DROP INDEX IF EXISTS idx_inventory_batches_status_expire;
+
+CREATE INDEX IF NOT EXISTS idx_inventory_batches_status_expire_batch
+  ON inventory_batches(status, expire_date, batch_id);
+
+CREATE INDEX IF NOT EXISTS idx_inventory_batches_location_expire_batch
+  ON inventory_batches(location, expire_date, batch_id);
+
+CREATE INDEX IF NOT EXISTS idx_inventory_batches_expire_batch
+  ON inventory_batches(expire_date, batch_id);
+
+CREATE INDEX IF NOT EXISTS idx_inventory_events_created_event
+  ON inventory_events(created_at, event_id);
@@ -0,0 +1,17 @@
+-- Indexes found missing by db/query_plans.py: each lookup below used to scan
+-- its whole table. Columns follow the query's equality filter, then its ORDER BY.
+
+CREATE INDEX IF NOT EXISTS idx_items_name
+  ON items(name);
+
+CREATE INDEX IF NOT EXISTS idx_inventory_events_batch_created
+  ON inventory_events(batch_id, created_at);
+
+CREATE INDEX IF NOT EXISTS idx_menu_plans_generated
+  ON menu_plans(generated_at);
+
+CREATE INDEX IF NOT EXISTS idx_menu_plan_items_menu_date_meal
+  ON menu_plan_items(menu_id, date, meal_type);
+
+CREATE INDEX IF NOT EXISTS idx_shopping_list_items_menu_checked_name
+  ON shopping_list_items(menu_id, checked, item_name_snapshot);
@@ -0,0 +1,72 @@
+-- Per-item in-stock totals for the planners, kept current by triggers.
+-- Only in-stock batches linked to an item are counted; quantities are applied
+-- as deltas and earliest_expire_date is re-read from the index below.
+
+CREATE TABLE IF NOT EXISTS inventory_totals (
+  item_id INTEGER NOT NULL,
+  unit TEXT NOT NULL,
+  total_qty REAL NOT NULL DEFAULT 0,
+  earliest_expire_date TEXT,
+  batch_count INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (item_id, unit)
+);
+
+CREATE INDEX IF NOT EXISTS idx_inventory_batches_item_unit_status_expire
+  ON inventory_batches(item_id, unit, status, expire_date);
+
+DELETE FROM inventory_totals;
+INSERT INTO inventory_totals(item_id, unit, total_qty, earliest_expire_date, batch_count)
+  SELECT item_id, unit, SUM(quantity), MIN(expire_date), COUNT(*) FROM inventory_batches
+  WHERE status = 'in_stock' AND item_id IS NOT NULL
+  GROUP BY item_id, unit;
+
+CREATE TRIGGER IF NOT EXISTS trg_totals_batches_insert
+AFTER INSERT ON inventory_batches
+WHEN NEW.status = 'in_stock' AND NEW.item_id IS NOT NULL
+BEGIN
+  INSERT INTO inventory_totals(item_id, unit, total_qty, earliest_expire_date, batch_count)
+    VALUES (NEW.item_id, NEW.unit, NEW.quantity, NEW.expire_date, 1)
+    ON CONFLICT(item_id, unit) DO UPDATE SET
+      total_qty = total_qty + excluded.total_qty,
+      earliest_expire_date = COALESCE(MIN(earliest_expire_date, excluded.earliest_expire_date),
+                                      earliest_expire_date, excluded.earliest_expire_date),
+      batch_count = batch_count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_totals_batches_update
+AFTER UPDATE OF item_id, unit, quantity, expire_date, status ON inventory_batches
+WHEN (OLD.status = 'in_stock' AND OLD.item_id IS NOT NULL)
+  OR (NEW.status = 'in_stock' AND NEW.item_id IS NOT NULL)
+BEGIN
+  UPDATE inventory_totals
+    SET total_qty = total_qty - OLD.quantity, batch_count = batch_count - 1
+    WHERE OLD.status = 'in_stock' AND item_id = OLD.item_id AND unit = OLD.unit;
+  DELETE FROM inventory_totals WHERE item_id = OLD.item_id AND unit = OLD.unit AND batch_count <= 0;
+  INSERT INTO inventory_totals(item_id, unit, total_qty, batch_count)
+    SELECT NEW.item_id, NEW.unit, NEW.quantity, 1 WHERE NEW.status = 'in_stock' AND NEW.item_id IS NOT NULL
+    ON CONFLICT(item_id, unit) DO UPDATE SET
+      total_qty = total_qty + excluded.total_qty,
+      batch_count = batch_count + 1;
+  UPDATE inventory_totals
+    SET earliest_expire_date = (
+      SELECT MIN(expire_date) FROM inventory_batches
+      WHERE item_id = inventory_totals.item_id AND unit = inventory_totals.unit AND status = 'in_stock'
+    )
+    WHERE (item_id = OLD.item_id AND unit = OLD.unit) OR (item_id = NEW.item_id AND unit = NEW.unit);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_totals_batches_delete
+AFTER DELETE ON inventory_batches
+WHEN OLD.status = 'in_stock' AND OLD.item_id IS NOT NULL
+BEGIN
+  UPDATE inventory_totals
+    SET total_qty = total_qty - OLD.quantity, batch_count = batch_count - 1
+    WHERE item_id = OLD.item_id AND unit = OLD.unit;
+  DELETE FROM inventory_totals WHERE item_id = OLD.item_id AND unit = OLD.unit AND batch_count <= 0;
+  UPDATE inventory_totals
+    SET earliest_expire_date = (
+      SELECT MIN(expire_date) FROM inventory_batches
+      WHERE item_id = OLD.item_id AND unit = OLD.unit AND status = 'in_stock'
+    )
+    WHERE item_id = OLD.item_id AND unit = OLD.unit;
+END;
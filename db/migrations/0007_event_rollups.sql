@@ -0,0 +1,26 @@
+-- Event retention: events older than the rollup horizon are summed per
+-- (item_id, event_type, day) into inventory_event_daily and their raw rows
+-- move to inventory_events_archive, so inventory_events only holds recent history.
+
+CREATE TABLE IF NOT EXISTS inventory_event_daily (
+  item_id INTEGER NOT NULL DEFAULT 0, -- 0: batch not linked to an item
+  event_type TEXT NOT NULL,
+  day TEXT NOT NULL,
+  sum_delta REAL NOT NULL DEFAULT 0,
+  event_count INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, item_id, event_type)
+);
+
+-- No foreign key: archived events outlive hot batches once those are archived too.
+CREATE TABLE IF NOT EXISTS inventory_events_archive (
+  event_id TEXT PRIMARY KEY,
+  batch_id TEXT NOT NULL,
+  event_type TEXT NOT NULL,
+  delta_quantity REAL,
+  note TEXT,
+  actor TEXT,
+  created_at TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_inventory_events_archive_batch_created
+  ON inventory_events_archive(batch_id, created_at);
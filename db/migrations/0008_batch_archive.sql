@@ -0,0 +1,24 @@
+-- Cold tier for finished batches. Consumed/discarded batches past the grace
+-- period move here (with their events) so inventory_batches only holds what
+-- is, or recently was, in the fridge. Status filters for finished rows read both.
+
+CREATE TABLE IF NOT EXISTS inventory_batches_archive (
+  batch_id TEXT PRIMARY KEY,
+  item_id INTEGER,
+  item_name_snapshot TEXT NOT NULL,
+  quantity REAL NOT NULL,
+  unit TEXT NOT NULL,
+  purchase_date TEXT,
+  expire_date TEXT,
+  location TEXT,
+  status TEXT NOT NULL,
+  source_type TEXT,
+  source_ref_id TEXT,
+  created_at TEXT NOT NULL,
+  updated_at TEXT NOT NULL,
+  archived_at TEXT NOT NULL
+);
+
+-- Archive reads always carry a status filter.
+CREATE INDEX IF NOT EXISTS idx_inventory_batches_archive_status_expire_batch
+  ON inventory_batches_archive(status, expire_date, batch_id);
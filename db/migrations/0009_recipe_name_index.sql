@@ -0,0 +1,4 @@
+-- Bulk import upserts recipes by name (lib/bulk_io.py); items(name) is indexed in 0005.
+
+CREATE INDEX IF NOT EXISTS idx_recipes_name
+  ON recipes(name);
@@ -0,0 +1,8 @@
+-- Calories promoted out of menu_plan_items.nutrition_json so per-day / per-plan
+-- totals aggregate in SQL (db.menu_calorie_totals) without decoding JSON rows.
+
+ALTER TABLE menu_plan_items ADD COLUMN calories REAL;
+
+UPDATE menu_plan_items
+SET calories = json_extract(nutrition_json, '$.calories')
+WHERE json_valid(nutrition_json);
@@ -0,0 +1,26 @@
+-- Integer forms of the TEXT dates, derived by SQLite so they can never drift:
+--   *_day       days since 1970-01-01 (utils.day_number), NULL for missing/unparsable dates
+--   *_epoch     unix seconds of the UTC timestamp
+-- Expiry windows and days-left become integer comparisons in SQL (db.list_expiring).
+
+ALTER TABLE inventory_batches ADD COLUMN expire_day INTEGER
+  GENERATED ALWAYS AS (CAST(julianday(expire_date) - 2440587.5 AS INTEGER)) VIRTUAL;
+
+ALTER TABLE inventory_batches ADD COLUMN purchase_day INTEGER
+  GENERATED ALWAYS AS (CAST(julianday(purchase_date) - 2440587.5 AS INTEGER)) VIRTUAL;
+
+ALTER TABLE inventory_batches ADD COLUMN created_epoch INTEGER
+  GENERATED ALWAYS AS (CAST(strftime('%s', created_at) AS INTEGER)) VIRTUAL;
+
+-- Archived batches come back through the same projections as hot ones.
+ALTER TABLE inventory_batches_archive ADD COLUMN expire_day INTEGER
+  GENERATED ALWAYS AS (CAST(julianday(expire_date) - 2440587.5 AS INTEGER)) VIRTUAL;
+
+ALTER TABLE inventory_events ADD COLUMN created_epoch INTEGER
+  GENERATED ALWAYS AS (CAST(strftime('%s', created_at) AS INTEGER)) VIRTUAL;
+
+CREATE INDEX IF NOT EXISTS idx_inventory_batches_status_expire_day
+  ON inventory_batches(status, expire_day);
+
+CREATE INDEX IF NOT EXISTS idx_inventory_events_created_epoch
+  ON inventory_events(created_epoch);
@@ -0,0 +1,367 @@
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence, Set
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from db.seed import seed
+from lib import db
+from lib.utils import add_days, format_date, now_ts, today
+
+
+# =========================
+# Query-plan regression suite for lib/db.py
+# - builds a scaled scratch database, calls every db function and captures the SQL it runs
+# - EXPLAIN QUERY PLAN on each statement; a full scan of a table the probe did not allow fails
+# - failing statements get an index suggestion
+# - usage: python db/query_plans.py [--batches N] [--verbose]
+# =========================
+
+LOCATIONS = ["fridge", "freezer", "pantry"]
+STATUSES = ["in_stock"] * 6 + ["consumed", "discarded"]
+
+
+@dataclass
+class Probe:
+    name: str
+    call: Callable[[], object]
+    # Whole-table reads by design (catalogue listings, rebuilds, unfiltered exports).
+    allow_scan: Set[str] = field(default_factory=set)
+
+
+# Keywords under three characters cannot use the trigram index and fall back to LIKE
+# over inventory_search (see db._keyword_search): a scan of the compact search table.
+SHORT_KEYWORD_SCAN = {"inventory_search"}
+
+
+@dataclass
+class Finding:
+    probe: str
+    sql: str
+    plan: List[str]
+    scanned: List[str]
+    suggestions: List[str]
+
+    @property
+    def failed(self) -> bool:
+        return bool(self.scanned)
+
+
+def build_dataset(batches: int) -> Dict[str, List[str]]:
+    seed()
+    rng = random.Random(42)
+    items = db.list_items()
+    batch_ids: List[str] = []
+    event_ids: List[str] = []
+    with db.unit_of_work() as uow:
+        for i in range(batches):
+            item = rng.choice(items)
+            batch_id = f"batch_{i:08d}"
+            expire = add_days(today(), rng.randint(-10, 60)) if rng.random() > 0.1 else None
+            uow.add_batch(
+                {
+                    "batch_id": batch_id,
+                    "item_id": item["item_id"],
+                    "item_name_snapshot": item["name"],
+                    "quantity": float(rng.randint(1, 500)),
+                    "unit": item["default_unit"],
+                    "purchase_date": format_date(today()),
+                    "expire_date": format_date(expire),
+                    "location": rng.choice(LOCATIONS),
+                    "status": rng.choice(STATUSES),
+                    "source_type": "import",
+                    "created_at": now_ts(),
+                    "updated_at": now_ts(),
+                }
+            )
+            for j in range(2):
+                event_id = f"evt_{i:08d}_{j}"
+                uow.add_event(
+                    {
+                        "event_id": event_id,
+                        "batch_id": batch_id,
+                        "event_type": "create" if j == 0 else "consume",
+                        "delta_quantity": 1.0,
+                        "created_at": now_ts(),
+                    }
+                )
+                event_ids.append(event_id)
+            batch_ids.append(batch_id)
+
+    menu_ids: List[str] = []
+    recipe_ids = [recipe["recipe_id"] for recipe in db.list_recipes()]
+    for m in range(max(10, batches // 100)):
+        menu_id = f"menu_{m:06d}"
+        db.insert_menu_plan(menu_id, 3, 2, {})
+        db.insert_menu_plan_items(
+            [
+                {
+                    "id": f"mpi_{m:06d}_{k}",
+                    "menu_id": menu_id,
+                    "date": format_date(add_days(today(), k // 2)),
+                    "meal_type": ["lunch", "dinner"][k % 2],
+                    "recipe_id": rng.choice(recipe_ids),
+                }
+                for k in range(6)
+            ]
+        )
+        db.insert_shopping_items(
+            [
+                {
+                    "id": f"shop_{m:06d}_{k}",
+                    "menu_id": menu_id,
+                    "item_id": item["item_id"],
+                    "item_name_snapshot": item["name"],
+                    "need_qty": 1.0,
+                    "unit": item["default_unit"],
+                }
+                for k, item in enumerate(rng.sample(items, 5))
+            ]
+        )
+        menu_ids.append(menu_id)
+    return {"batches": batch_ids, "events": event_ids, "menus": menu_ids}
+
+
+def build_probes(ids: Dict[str, List[str]]) -> List[Probe]:
+    batch_id = ids["batches"][len(ids["batches"]) // 2]
+    menu_id = ids["menus"][len(ids["menus"]) // 2]
+    shop_id = f"shop_{menu_id[len('menu_'):]}_0"
+    first_page = db.list_batches_page({}, limit=20)
+    undated_cursor = (None, "batch_")
+    events_page = db.list_events_page(limit=20)
+
+    def unit_of_work() -> None:
+        with db.unit_of_work() as uow:
+            uow.update_batch(batch_id, {"location": "fridge"})
+            uow.deplete_batch(batch_id, 0.0, "consumed")
+
+    return [
+        Probe("upsert_image", lambda: db.upsert_image("img_probe", "/tmp/probe.jpg")),
+        Probe("get_image", lambda: db.get_image("img_probe")),
+        Probe("list_items", db.list_items, allow_scan={"items"}),
+        Probe("get_item_by_name", lambda: db.get_item_by_name("鸡蛋")),
+        Probe("list_recipes", db.list_recipes, allow_scan={"recipes"}),
+        Probe("iter_recipes", lambda: list(db.iter_recipes()), allow_scan={"recipes"}),
+        Probe("iter_recipe_records", lambda: list(db.iter_recipe_records()), allow_scan={"recipes"}),
+        Probe("get_recipes", lambda: db.get_recipes([1, 2, 3])),
+        Probe("list_recipe_ingredients", db.list_recipe_ingredients, allow_scan={"recipe_ingredients"}),
+        Probe(
+            "iter_recipe_ingredient_records",
+            lambda: list(db.iter_recipe_ingredient_records()),
+            allow_scan={"recipe_ingredients"},
+        ),
+        Probe("get_batch", lambda: db.get_batch(batch_id)),
+        Probe("get_batches", lambda: db.get_batches([batch_id, "batch_missing"])),
+        Probe("update_batch", lambda: db.update_batch(batch_id, {"location": "freezer"})),
+        Probe("unit_of_work", unit_of_work),
+        Probe("list_batches(all)", lambda: db.list_batches({}), allow_scan={"inventory_batches"}),
+        Probe("list_batches(status)", lambda: db.list_batches({"status": "in_stock"}, limit=50)),
+        Probe("list_batches(location)", lambda: db.list_batches({"location": "pantry"}, limit=50)),
+        Probe("list_batches(keyword)", lambda: db.list_batches({"keyword": "牛肉片"}, limit=50)),
+        Probe(
+            "list_batches(short keyword)",
+            lambda: db.list_batches({"keyword": "鸡"}, limit=50),
+            allow_scan=SHORT_KEYWORD_SCAN,
+        ),
+        Probe("iter_batch_records", lambda: list(db.iter_batch_records({"status": "in_stock"}, limit=50))),
+        Probe("list_batches(finished)", lambda: db.list_batches({"status": "consumed"}, limit=50)),
+        Probe("list_batches(finished keyword)", lambda: db.list_batches({"status": "consumed", "keyword": "牛肉片"}, limit=50)),
+        Probe("list_batches_page(first)", lambda: db.list_batches_page({}, limit=20)),
+        Probe("list_batches_page(next)", lambda: db.list_batches_page({}, after=first_page["next"], limit=20)),
+        Probe("list_batches_page(undated)", lambda: db.list_batches_page({}, after=undated_cursor, limit=20)),
+        Probe("list_batches_page(status)", lambda: db.list_batches_page({"status": "consumed"}, limit=20)),
+        Probe("list_batches_page(location)", lambda: db.list_batches_page({"location": "fridge"}, limit=20)),
+        Probe("list_batches_page(finished)", lambda: db.list_batches_page({"status": "discarded"}, limit=20)),
+        Probe(
+            "list_batches_page(finished keyword)",
+            lambda: db.list_batches_page({"status": "discarded", "keyword": "牛肉片"}, limit=20),
+            # The archive has no search index; names are matched against the small item catalogue.
+            allow_scan={"items"},
+        ),
+        Probe(
+            "list_batches_page(finished short keyword)",
+            lambda: db.list_batches_page({"status": "discarded", "keyword": "鸡"}, limit=20),
+            allow_scan={"items"} | SHORT_KEYWORD_SCAN,
+        ),
+        Probe("get_batch(archived)", lambda: db.get_batch("batch_missing", include_archived=True)),
+        Probe("archive_finished_batches", lambda: db.archive_finished_batches(30)),
+        Probe("list_events", lambda: db.list_events(10)),
+        Probe("list_events_page", lambda: db.list_events_page(before=events_page["next"], limit=20)),
+        Probe("list_batch_events", lambda: db.list_batch_events(batch_id)),
+        Probe("rollup_events", lambda: db.rollup_events(30)),
+        Probe("list_event_daily", lambda: db.list_event_daily(format_date(add_days(today(), -30)))),
+        Probe("list_expiring", lambda: db.list_expiring(3, limit=30)),
+        Probe("list_inventory_totals", db.list_inventory_totals, allow_scan={"inventory_totals"}),
+        Probe(
+            "rebuild_inventory_totals",
+            db.rebuild_inventory_totals,
+            allow_scan={"inventory_batches", "inventory_totals"},
+        ),
+        Probe("list_menu_ids", lambda: db.list_menu_ids(20)),
+        Probe("get_menu", lambda: db.get_menu(menu_id)),
+        Probe("menu_calorie_totals", lambda: db.menu_calorie_totals(menu_id)),
+        Probe("list_shopping_items", lambda: db.list_shopping_items(menu_id)),
+        Probe("update_shopping_item_checked", lambda: db.update_shopping_item_checked(shop_id, True)),
+        Probe("set_shopping_items_checked", lambda: db.set_shopping_items_checked(menu_id, [shop_id], False)),
+        Probe("set_shopping_items_checked_all", lambda: db.set_shopping_items_checked(menu_id, None, True)),
+        Probe("set_shopping_items_checked_state", lambda: db.set_shopping_items_checked_state(menu_id, [shop_id])),
+        Probe("get_kpi_counters", lambda: db.get_kpi_counters(3), allow_scan={"kpi_counters"}),
+        Probe(
+            "check_kpi_counters",
+            lambda: db.check_kpi_counters(repair=False),
+            allow_scan={"inventory_batches", "recipes", "kpi_counters", "inventory_expiry_buckets"},
+        ),
+        Probe("schema_version", db.schema_version),
+    ]
+
+
+def _capture(probe: Probe) -> List[str]:
+    statements: List[str] = []
+    conn = db.get_connection()
+    conn.set_trace_callback(statements.append)
+    try:
+        result = probe.call()
+        if hasattr(result, "__next__"):
+            list(result)
+    finally:
+        conn.set_trace_callback(None)
+    return [
+        sql
+        for sql in statements
+        if re.match(r"\s*(SELECT|UPDATE|DELETE|WITH|INSERT\s+INTO\s+\w+\s*(\([^)]*\))?\s*SELECT)", sql, re.I)
+    ]
+
+
+_FULL_SCAN = re.compile(r"^SCAN (\w+)(?: AS (\w+))?( USING (?:COVERING )?INDEX \w+)?$")
+# A virtual table (FTS5) that took no constraint: an empty idxStr after the colon.
+_VIRTUAL_SCAN = re.compile(r"^SCAN (\w+)(?: AS (\w+))? VIRTUAL TABLE INDEX \d+:$")
+_AUTOMATIC_INDEX = re.compile(r"\bAUTOMATIC (?:PARTIAL )?(?:COVERING )?INDEX\b")
+_LIMIT = re.compile(r"\bLIMIT\s+\d+", re.I)
+
+
+def _scanned_tables(sql: str, plan: Sequence[str], conn: sqlite3.Connection) -> List[str]:
+    """Tables read end to end. An index walk that feeds ORDER BY ... LIMIT n stops early and is fine."""
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    aliases = {alias: table for table, alias in re.findall(r"\b(?:FROM|JOIN)\s+(\w+)\s+(?:AS\s+)?(\w+)", sql, flags=re.I)}
+    ordered_limit = bool(_LIMIT.search(sql)) and not any("TEMP B-TREE" in detail for detail in plan)
+    scanned = []
+    for detail in plan:
+        if _AUTOMATIC_INDEX.search(detail):
+            scanned.append(detail.split()[1])
+            continue
+        match = _FULL_SCAN.match(detail)
+        if match and match.group(3) and ordered_limit:
+            continue
+        match = match or _VIRTUAL_SCAN.match(detail)
+        if not match:
+            continue
+        name = aliases.get(match.group(1), match.group(1))
+        if name in tables:
+            scanned.append(name)
+    return scanned
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def suggest_index(sql: str, table: str, conn: sqlite3.Connection) -> str:
+    """Heuristic covering index: equality columns, then range columns, then ORDER BY columns."""
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    if row and re.match(r"\s*CREATE\s+VIRTUAL\s+TABLE\b", row[0] or "", re.I):
+        return f"-- {table} is a virtual table: constrain it with MATCH or rowid, or allow the scan on the probe"
+    columns = _columns(conn, table)
+    where = re.split(r"\bORDER\s+BY\b", sql, flags=re.I)[0]
+    order = re.search(r"\bORDER\s+BY\b(.*?)(\bLIMIT\b|$)", sql, flags=re.I | re.S)
+    picked: List[str] = []
+
+    def add(col: str) -> None:
+        if col in columns and col not in picked:
+            picked.append(col)
+
+    for col in re.findall(r"\b(\w+)\s*(?:=|\bIN\b)", where, flags=re.I):
+        add(col)
+    for col in re.findall(r"\b(\w+)\s*(?:[<>]=?|\bLIKE\b|\bBETWEEN\b)", where, flags=re.I):
+        add(col)
+    if order:
+        for col in re.findall(r"\b(\w+)\b", order.group(1)):
+            add(col)
+    select = re.match(r"\s*SELECT\s+(.*?)\s+FROM\b", sql, flags=re.I | re.S)
+    if select and "*" not in select.group(1):
+        for col in re.findall(r"\b(\w+)\b", select.group(1)):
+            add(col)
+    if not picked:
+        return f"-- no filter or order columns found for {table}; consider a LIMIT or a narrower query"
+    return f"CREATE INDEX IF NOT EXISTS idx_{table}_{'_'.join(picked)} ON {table}({', '.join(picked)});"
+
+
+def run(batches: int, verbose: bool = False) -> List[Finding]:
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = Path(tmp) / "query_plans.db"
+        # Write on this thread and skip the query cache so _capture's trace callback sees every statement.
+        db.WRITE_QUEUE = False
+        db.QUERY_CACHE_SIZE = 0
+        db.init_db()
+        ids = build_dataset(batches)
+        explain = sqlite3.connect(db.DB_PATH)
+        findings: List[Finding] = []
+        try:
+            for probe in build_probes(ids):
+                for sql in _capture(probe):
+                    plan = [row[3] for row in explain.execute(f"EXPLAIN QUERY PLAN {sql}")]
+                    scanned = [t for t in _scanned_tables(sql, plan, explain) if t not in probe.allow_scan]
+                    if verbose:
+                        print(f"[{probe.name}] {' '.join(sql.split())[:100]}")
+                        for detail in plan:
+                            print(f"    {detail}")
+                    # Full scans fail the run; a temp B-tree sort on an indexed search is only reported.
+                    if scanned or any("TEMP B-TREE" in detail for detail in plan):
+                        findings.append(
+                            Finding(
+                                probe=probe.name,
+                                sql=" ".join(sql.split()),
+                                plan=plan,
+                                scanned=scanned,
+                                suggestions=[suggest_index(sql, table, explain) for table in scanned],
+                            )
+                        )
+        finally:
+            explain.close()
+            db.close_all()
+    return findings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fail if any lib/db.py query falls back to a full table scan")
+    parser.add_argument("--batches", type=int, default=20000, help="inventory batches in the scaled dataset")
+    parser.add_argument("--verbose", action="store_true", help="print every captured plan")
+    args = parser.parse_args()
+
+    findings = run(args.batches, verbose=args.verbose)
+    for finding in findings:
+        if not finding.failed:
+            print(f"TEMP SORT [{finding.probe}] {finding.sql[:120]}")
+            continue
+        print(f"FULL SCAN [{finding.probe}] on {', '.join(finding.scanned)}")
+        print(f"  sql : {finding.sql[:200]}")
+        for detail in finding.plan:
+            print(f"  plan: {detail}")
+        for suggestion in finding.suggestions:
+            print(f"  hint: {suggestion}")
+    failures = sum(finding.failed for finding in findings)
+    if failures:
+        print(f"{failures} statement(s) fall back to a full table scan")
+        sys.exit(1)
+    print("Query plans OK: no unexpected full table scans")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,26 @@
 from __future__ import annotations
 
-import uuid
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
 from . import db
-from .utils import add_days, format_date, now_ts, parse_date, today
+from .utils import add_days, format_date, new_id, now_ts, today
 from .planner_provider import ProviderNotAvailable as PlannerNotAvailable
 from .planner_provider import get_planner
 from .vision_provider import ProviderNotAvailable, get_provider
 
 UPLOAD_DIR = Path(__file__).resolve().parents[1] / "data" / "uploads"
+FALLBACK_PROVIDER = "mock"
+FALLBACK_PLANNER = "greedy"
+EDITABLE_BATCH_FIELDS = ("quantity", "expire_date", "location")
+
+
+def household(household_id: Optional[str]):
+    """Context manager: API calls inside the block use ``household_id``'s own database.
+
+    Each household's file is created and migrated on its first call.
+    """
+    return db.household(household_id)
 
 
 def ensure_initialized() -> None:
@@ -19,7 +29,7 @@ def ensure_initialized() -> None:
 
 def upload_image(file) -> Dict[str, str]:
     ensure_initialized()
-    image_id = f"img_{uuid.uuid4().hex[:8]}"
+    image_id = new_id("img")
     UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
     ext = Path(file.name).suffix or ".jpg"
     file_path = UPLOAD_DIR / f"{image_id}{ext}"
@@ -29,107 +39,183 @@ def upload_image(file) -> Dict[str, str]:
     return {"image_id": image_id, "image_path": str(file_path)}
 
 
+def degraded_reason(exc: Exception, error_code: str) -> str:
+    """Why a provider call fell back; shared by the sync and async detect/generate_menu."""
+    if isinstance(exc, (ProviderNotAvailable, PlannerNotAvailable)):
+        return f"{exc.code}: {exc.reason}"
+    return f"{error_code}: {exc}"
+
+
+def fallback_meta(kind: str, requested: str, fallback: str, reason: str) -> Dict[str, Any]:
+    """The ``meta`` block of detect (``kind="provider"``) and generate_menu (``kind="planner"``)."""
+    return {
+        f"{kind}_requested": requested,
+        f"{kind}_used": fallback if reason else requested,
+        "degraded": bool(reason),
+        "reason": reason,
+    }
+
+
 def detect(image_id: str, provider: str = "mock", top_k: int = 12) -> Dict[str, Any]:
     ensure_initialized()
     reason = ""
-    used_provider = provider
-    degraded = False
     try:
-        vision = get_provider(provider)
-        detections = vision.detect(image_id=image_id, top_k=top_k)
-    except ProviderNotAvailable as exc:
-        reason = f"{exc.code}: {exc.reason}"
-        degraded = True
-        used_provider = "mock"
-        vision = get_provider("mock")
-        detections = vision.detect(image_id=image_id, top_k=top_k)
+        detections = get_provider(provider).detect(image_id=image_id, top_k=top_k)
     except Exception as exc:  # noqa: BLE001
-        reason = f"PROVIDER_ERROR: {exc}"
-        degraded = True
-        used_provider = "mock"
-        vision = get_provider("mock")
-        detections = vision.detect(image_id=image_id, top_k=top_k)
-    return {
-        "detections": detections,
-        "meta": {
-            "provider_requested": provider,
-            "provider_used": used_provider,
-            "degraded": degraded,
-            "reason": reason,
-        },
-    }
+        reason = degraded_reason(exc, "PROVIDER_ERROR")
+        detections = get_provider(FALLBACK_PROVIDER).detect(image_id=image_id, top_k=top_k)
+    return {"detections": detections, "meta": fallback_meta("provider", provider, FALLBACK_PROVIDER, reason)}
 
 
 def bulk_create_batches(source: Dict[str, Any], batches: List[Dict[str, Any]]) -> Dict[str, Any]:
     ensure_initialized()
     created = []
-    for batch in batches:
-        batch_id = f"batch_{uuid.uuid4().hex[:8]}"
-        payload = {
-            "batch_id": batch_id,
-            "item_id": batch.get("item_id"),
-            "item_name_snapshot": batch.get("item_name") or batch.get("item_name_snapshot"),
-            "quantity": float(batch.get("quantity", 1)),
-            "unit": batch.get("unit") or "unit",
-            "purchase_date": format_date(today()),
-            "expire_date": batch.get("expire_date") or batch.get("suggest_expire_date"),
-            "location": batch.get("location") or "fridge",
-            "status": "in_stock",
-            "source_type": source.get("type"),
-            "source_ref_id": source.get("image_id"),
-            "created_at": now_ts(),
-            "updated_at": now_ts(),
-        }
-        db.insert_batch(payload)
-        event = {
-            "event_id": f"evt_{uuid.uuid4().hex[:8]}",
-            "batch_id": batch_id,
-            "event_type": "create",
-            "delta_quantity": payload["quantity"],
-            "note": "入库创建",
-            "actor": "system",
-            "created_at": now_ts(),
-        }
-        db.insert_event(event)
-        created.append(payload)
+    with db.unit_of_work() as uow:
+        for batch in batches:
+            batch_id = new_id("batch")
+            payload = {
+                "batch_id": batch_id,
+                "item_id": batch.get("item_id"),
+                "item_name_snapshot": batch.get("item_name") or batch.get("item_name_snapshot"),
+                "quantity": float(batch.get("quantity", 1)),
+                "unit": batch.get("unit") or "unit",
+                "purchase_date": format_date(today()),
+                "expire_date": batch.get("expire_date") or batch.get("suggest_expire_date"),
+                "location": batch.get("location") or "fridge",
+                "status": "in_stock",
+                "source_type": source.get("type"),
+                "source_ref_id": source.get("image_id"),
+                "created_at": now_ts(),
+                "updated_at": now_ts(),
+            }
+            uow.add_batch(payload)
+            event = {
+                "event_id": new_id("evt"),
+                "batch_id": batch_id,
+                "event_type": "create",
+                "delta_quantity": payload["quantity"],
+                "note": "入库创建",
+                "actor": "system",
+                "created_at": now_ts(),
+            }
+            uow.add_event(event)
+            created.append(payload)
     return {"created": created}
 
 
-def list_batches(filters: Dict[str, Any]) -> Dict[str, Any]:
+def list_batches(filters: Dict[str, Any], limit: Optional[int] = None, as_records: bool = False) -> Dict[str, Any]:
     ensure_initialized()
-    return {"batches": db.list_batches(filters)}
+    with db.read_snapshot():
+        if as_records:
+            return {"batches": list(db.iter_batch_records(filters, limit))}
+        return {"batches": db.list_batches(filters, limit)}
 
 
-def update_batch(batch_id: str, patch: Dict[str, Any]) -> Dict[str, Any]:
+def list_batches_page(
+    filters: Dict[str, Any],
+    after: Optional[Tuple[Optional[str], str]] = None,
+    limit: int = 50,
+    columns: Optional[List[str]] = None,
+) -> Dict[str, Any]:
     ensure_initialized()
-    db.update_batch(batch_id, patch)
-    batch = db.get_batch(batch_id)
-    if batch:
-        event = {
-            "event_id": f"evt_{uuid.uuid4().hex[:8]}",
-            "batch_id": batch_id,
-            "event_type": "adjust",
-            "delta_quantity": patch.get("quantity"),
-            "note": "编辑批次信息",
-            "actor": "user",
-            "created_at": now_ts(),
+    with db.read_snapshot():
+        return db.list_batches_page(filters, after=after, limit=limit, columns=columns)
+
+
+def inventory_metrics() -> Dict[str, Any]:
+    ensure_initialized()
+    with db.read_snapshot():
+        counters = db.get_kpi_counters(expiring_days=3)
+        return {
+            "in_stock": counters.get("in_stock_batches", 0),
+            "expiring_soon": counters.get("expiring", 0) - counters.get("expired", 0),
+            "expired": counters.get("expired", 0),
+            "unknown_expiry": counters.get("in_stock_no_expiry", 0),
         }
-        db.insert_event(event)
-    return batch or {}
+
+
+def update_batch(batch_id: str, patch: Dict[str, Any]) -> Dict[str, Any]:
+    ensure_initialized()
+    if not db.get_batch(batch_id):
+        return {}
+    event = {
+        "event_id": new_id("evt"),
+        "batch_id": batch_id,
+        "event_type": "adjust",
+        "delta_quantity": patch.get("quantity"),
+        "note": "编辑批次信息",
+        "actor": "user",
+        "created_at": now_ts(),
+    }
+    with db.unit_of_work() as uow:
+        uow.update_batch(batch_id, patch)
+        uow.add_event(event)
+    return db.get_batch(batch_id) or {}
+
+
+def _edit_value(field: str, value: Any) -> Any:
+    if value is None or value != value or value == "":  # NaN from the table editor compares unequal to itself
+        return None
+    if field == "quantity":
+        return float(value)
+    return str(value)
+
+
+def apply_batch_edits(edits: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Diff edited rows against the stored batches and write every change in one transaction.
+
+    Each edit is a dict with ``batch_id`` plus any of ``EDITABLE_BATCH_FIELDS``;
+    rows without a known batch_id are reported under ``missing``.
+    """
+    ensure_initialized()
+    edits = [edit for edit in edits if _edit_value("batch_id", edit.get("batch_id"))]
+    with db.read_snapshot():
+        current = db.get_batches(edit["batch_id"] for edit in edits)
+    changes: List[Dict[str, Any]] = []
+    missing: List[str] = []
+    with db.unit_of_work() as uow:
+        for edit in edits:
+            batch_id = edit["batch_id"]
+            original = current.get(batch_id)
+            if original is None:
+                missing.append(batch_id)
+                continue
+            patch: Dict[str, Any] = {}
+            for field in EDITABLE_BATCH_FIELDS:
+                if field not in edit:
+                    continue
+                value = _edit_value(field, edit[field])
+                if value != _edit_value(field, original[field]):
+                    patch[field] = value
+            if not patch:
+                continue
+            uow.update_batch(batch_id, patch)
+            uow.add_event(
+                {
+                    "event_id": new_id("evt"),
+                    "batch_id": batch_id,
+                    "event_type": "adjust",
+                    "delta_quantity": patch.get("quantity"),
+                    "note": "编辑批次信息",
+                    "actor": "user",
+                    "created_at": now_ts(),
+                }
+            )
+            changes.append({"batch_id": batch_id, "patch": patch})
+    return {
+        "updated": len(changes),
+        "unchanged": len(edits) - len(changes) - len(missing),
+        "missing": missing,
+        "changes": changes,
+    }
 
 
 def consume_batch(batch_id: str, delta_quantity: float, note: str = "") -> Dict[str, Any]:
     ensure_initialized()
-    batch = db.get_batch(batch_id)
-    if not batch:
+    if not db.get_batch(batch_id):
         return {}
-    new_qty = max(0.0, float(batch["quantity"]) - delta_quantity)
-    patch = {"quantity": new_qty}
-    if new_qty == 0:
-        patch["status"] = "consumed"
-    db.update_batch(batch_id, patch)
     event = {
-        "event_id": f"evt_{uuid.uuid4().hex[:8]}",
+        "event_id": new_id("evt"),
         "batch_id": batch_id,
         "event_type": "consume",
         "delta_quantity": -abs(delta_quantity),
@@ -137,22 +223,18 @@ def consume_batch(batch_id: str, delta_quantity: float, note: str = "") -> Dict[
         "actor": "user",
         "created_at": now_ts(),
     }
-    db.insert_event(event)
+    with db.unit_of_work() as uow:
+        uow.deplete_batch(batch_id, delta_quantity, "consumed")
+        uow.add_event(event)
     return event
 
 
 def discard_batch(batch_id: str, delta_quantity: float, reason: str = "") -> Dict[str, Any]:
     ensure_initialized()
-    batch = db.get_batch(batch_id)
-    if not batch:
+    if not db.get_batch(batch_id):
         return {}
-    new_qty = max(0.0, float(batch["quantity"]) - delta_quantity)
-    patch = {"quantity": new_qty}
-    if new_qty == 0:
-        patch["status"] = "discarded"
-    db.update_batch(batch_id, patch)
     event = {
-        "event_id": f"evt_{uuid.uuid4().hex[:8]}",
+        "event_id": new_id("evt"),
         "batch_id": batch_id,
         "event_type": "discard",
         "delta_quantity": -abs(delta_quantity),
@@ -160,50 +242,61 @@ def discard_batch(batch_id: str, delta_quantity: float, reason: str = "") -> Dic
         "actor": "user",
         "created_at": now_ts(),
     }
-    db.insert_event(event)
+    with db.unit_of_work() as uow:
+        uow.deplete_batch(batch_id, delta_quantity, "discarded")
+        uow.add_event(event)
     return event
 
 
 def list_events(limit: int = 10) -> Dict[str, Any]:
     ensure_initialized()
-    return {"events": db.list_events(limit)}
+    with db.read_snapshot():
+        return {"events": db.list_events(limit)}
+
+
+def list_events_page(before: Optional[Tuple[str, str]] = None, limit: int = 20) -> Dict[str, Any]:
+    ensure_initialized()
+    with db.read_snapshot():
+        return db.list_events_page(before=before, limit=limit)
 
 
 def list_batch_events(batch_id: str) -> Dict[str, Any]:
     ensure_initialized()
-    return {"events": db.list_batch_events(batch_id)}
+    with db.read_snapshot():
+        return {"events": db.list_batch_events(batch_id)}
+
+
+def rollup_events(retention_days: Optional[int] = None) -> Dict[str, Any]:
+    ensure_initialized()
+    return db.rollup_events(retention_days)
+
+
+def archive_finished_batches(grace_days: Optional[int] = None) -> Dict[str, Any]:
+    ensure_initialized()
+    return db.archive_finished_batches(grace_days)
+
+
+def list_event_daily(since: Optional[str] = None, item_id: Optional[int] = None) -> Dict[str, Any]:
+    ensure_initialized()
+    with db.read_snapshot():
+        return {"days": db.list_event_daily(since, item_id)}
 
 
 def dashboard_summary() -> Dict[str, Any]:
     ensure_initialized()
-    batches = db.list_batches({})
-    in_stock = [b for b in batches if b["status"] == "in_stock"]
-    expiring = 0
-    for batch in in_stock:
-        if batch.get("expire_date"):
-            days_left = (parse_date(batch["expire_date"]) - today()).days
-            if days_left <= 3:
-                expiring += 1
-    recipes = db.list_recipes()
-    return {
-        "kpi_expiring": expiring,
-        "kpi_batches": len(in_stock),
-        "kpi_recipes": len(recipes),
-    }
+    with db.read_snapshot():
+        counters = db.get_kpi_counters(expiring_days=3)
+        return {
+            "kpi_expiring": counters.get("expiring", 0),
+            "kpi_batches": counters.get("in_stock_batches", 0),
+            "kpi_recipes": counters.get("recipes", 0),
+        }
 
 
-def list_expiring(days: int = 3) -> Dict[str, Any]:
+def list_expiring(days: int = 3, limit: Optional[int] = None) -> Dict[str, Any]:
     ensure_initialized()
-    batches = db.list_batches({"status": "in_stock"})
-    upcoming = []
-    for batch in batches:
-        if batch.get("expire_date"):
-            days_left = (parse_date(batch["expire_date"]) - today()).days
-            if days_left <= days:
-                batch = {**batch, "days_left": days_left}
-                upcoming.append(batch)
-    upcoming.sort(key=lambda x: x.get("days_left", 999))
-    return {"batches": upcoming}
+    with db.read_snapshot():
+        return {"batches": db.list_expiring(days, limit)}
 
 
 def generate_menu(
@@ -214,43 +307,41 @@ def generate_menu(
 ) -> Dict[str, Any]:
     ensure_initialized()
     reason = ""
-    used_planner = planner
-    degraded = False
     try:
-        planner_provider = get_planner(planner)
-        result = planner_provider.generate(days, servings, constraints)
-    except PlannerNotAvailable as exc:
-        reason = f"{exc.code}: {exc.reason}"
-        degraded = True
-        used_planner = "greedy"
-        planner_provider = get_planner("greedy")
-        result = planner_provider.generate(days, servings, constraints)
+        result = get_planner(planner).generate(days, servings, constraints)
     except Exception as exc:  # noqa: BLE001
-        reason = f"PLANNER_ERROR: {exc}"
-        degraded = True
-        used_planner = "greedy"
-        planner_provider = get_planner("greedy")
-        result = planner_provider.generate(days, servings, constraints)
-    return {
-        **result,
-        "meta": {
-            "planner_requested": planner,
-            "planner_used": used_planner,
-            "degraded": degraded,
-            "reason": reason,
-        },
-    }
+        reason = degraded_reason(exc, "PLANNER_ERROR")
+        result = get_planner(FALLBACK_PLANNER).generate(days, servings, constraints)
+    return {**result, "meta": fallback_meta("planner", planner, FALLBACK_PLANNER, reason)}
 
 
 def get_menu(menu_id: str) -> Dict[str, Any]:
     ensure_initialized()
-    menu = db.get_menu(menu_id)
+    with db.read_snapshot():
+        menu = db.get_menu(menu_id)
     return menu or {}
 
 
+def get_menu_calories(menu_id: str) -> Dict[str, Any]:
+    ensure_initialized()
+    with db.read_snapshot():
+        return db.menu_calorie_totals(menu_id)
+
+
 def get_shopping_list(menu_id: str) -> Dict[str, Any]:
     ensure_initialized()
-    return {"items": db.list_shopping_items(menu_id)}
+    with db.read_snapshot():
+        return {"items": db.list_shopping_items(menu_id)}
+
+
+def set_shopping_items_checked(menu_id: str, item_ids: Optional[List[str]], checked: bool) -> Dict[str, Any]:
+    ensure_initialized()
+    return {"changed": db.set_shopping_items_checked(menu_id, item_ids, checked)}
+
+
+def set_shopping_items_checked_state(menu_id: str, checked_ids: List[str]) -> Dict[str, Any]:
+    ensure_initialized()
+    return {"changed": db.set_shopping_items_checked_state(menu_id, checked_ids)}
 
 
 def update_shopping_item_checked(item_id: str, checked: bool) -> Dict[str, Any]:
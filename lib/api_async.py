@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from . import api, db
+from .planner_provider import HttpPlannerProvider, get_planner
+from .schemas import HttpRequest
+from .vision_provider import HFOwlViTVisionProvider, HttpVisionProvider, get_provider
+
+# =========================
+# Awaitable facade over lib.api
+# - DB work runs on a bounded executor (no more threads than pooled connections)
+# - HTTP providers use httpx.AsyncClient when installed, otherwise requests on asyncio's default executor
+# - local model inference (OWL-ViT) runs on its own small worker pool
+# =========================
+
+DB_WORKERS = int(os.getenv("SMART_FRIDGE_ASYNC_DB_WORKERS", str(db.POOL_MAX_SIZE)))
+MODEL_WORKERS = int(os.getenv("SMART_FRIDGE_ASYNC_MODEL_WORKERS", "1"))
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+# AsyncClient is bound to the loop it first ran on: one pooled client per running loop.
+_http_clients: Dict[asyncio.AbstractEventLoop, Any] = {}
+_http_clients_lock = threading.Lock()
+
+
+def _executor(kind: str) -> ThreadPoolExecutor:
+    with _executors_lock:
+        executor = _executors.get(kind)
+        if executor is None:
+            workers = DB_WORKERS if kind == "db" else MODEL_WORKERS
+            executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix=f"smart-fridge-{kind}")
+            _executors[kind] = executor
+        return executor
+
+
+async def _run(kind: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    # run_in_executor does not carry contextvars over; copy them so api.household() applies in the worker.
+    loop = asyncio.get_running_loop()
+    call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+    return await loop.run_in_executor(_executor(kind), call)
+
+
+async def run_db(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    return await _run("db", fn, *args, **kwargs)
+
+
+async def run_model(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    return await _run("model", fn, *args, **kwargs)
+
+
+def _httpx():
+    try:
+        import httpx
+    except ImportError:
+        return None
+    return httpx
+
+
+def _http_client(httpx: Any, loop: asyncio.AbstractEventLoop) -> Any:
+    with _http_clients_lock:
+        # A closed loop can no longer run its client's aclose(); drop the reference so it can be collected.
+        for stale in [owner for owner in _http_clients if owner.is_closed()]:
+            del _http_clients[stale]
+        client = _http_clients.get(loop)
+        if client is None:
+            client = _http_clients[loop] = httpx.AsyncClient()
+        return client
+
+
+async def _post_json(request: HttpRequest) -> Tuple[int, str]:
+    """POST ``request.payload`` as JSON and return (status_code, body text)."""
+    httpx = _httpx()
+    if httpx is None:
+        def post() -> Tuple[int, str]:
+            response = requests.post(
+                request.url, headers=request.headers, json=request.payload, timeout=request.timeout
+            )
+            return response.status_code, response.text
+
+        return await asyncio.to_thread(post)
+    client = _http_client(httpx, asyncio.get_running_loop())
+    response = await client.post(request.url, headers=request.headers, json=request.payload, timeout=request.timeout)
+    return response.status_code, response.text
+
+
+async def aclose() -> None:
+    """Close the shared HTTP clients and stop the worker pools.
+
+    Call it before the event loop ends (e.g. last thing in the coroutine given
+    to ``asyncio.run``): each client is closed on the loop it belongs to.
+    """
+    loop = asyncio.get_running_loop()
+    with _http_clients_lock:
+        clients = list(_http_clients.items())
+        _http_clients.clear()
+    for owner, client in clients:
+        if owner is loop:
+            await client.aclose()
+        elif owner.is_running():
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(client.aclose(), owner))
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=False)
+
+
+household = api.household
+
+
+async def upload_image(file) -> Dict[str, str]:
+    return await run_db(api.upload_image, file)
+
+
+async def _detect(provider: str, image_id: str, top_k: int) -> List[Dict[str, Any]]:
+    vision = await run_db(get_provider, provider)
+    if isinstance(vision, HttpVisionProvider):
+        request = await run_db(vision.build_request, image_id, top_k)
+        status, text = await _post_json(request)
+        return await run_db(vision.parse_response, image_id, status, text)
+    if isinstance(vision, HFOwlViTVisionProvider):
+        return await run_model(vision.detect, image_id=image_id, top_k=top_k)
+    return await run_db(vision.detect, image_id=image_id, top_k=top_k)
+
+
+async def detect(image_id: str, provider: str = "mock", top_k: int = 12) -> Dict[str, Any]:
+    await run_db(api.ensure_initialized)
+    reason = ""
+    try:
+        detections = await _detect(provider, image_id, top_k)
+    except Exception as exc:  # noqa: BLE001
+        reason = api.degraded_reason(exc, "PROVIDER_ERROR")
+        detections = await run_db(get_provider(api.FALLBACK_PROVIDER).detect, image_id=image_id, top_k=top_k)
+    return {"detections": detections, "meta": api.fallback_meta("provider", provider, api.FALLBACK_PROVIDER, reason)}
+
+
+async def bulk_create_batches(source: Dict[str, Any], batches: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return await run_db(api.bulk_create_batches, source, batches)
+
+
+async def list_batches(filters: Dict[str, Any], limit: Optional[int] = None, as_records: bool = False) -> Dict[str, Any]:
+    return await run_db(api.list_batches, filters, limit, as_records)
+
+
+async def list_batches_page(
+    filters: Dict[str, Any],
+    after: Optional[Tuple[Optional[str], str]] = None,
+    limit: int = 50,
+    columns: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    return await run_db(api.list_batches_page, filters, after=after, limit=limit, columns=columns)
+
+
+async def inventory_metrics() -> Dict[str, Any]:
+    return await run_db(api.inventory_metrics)
+
+
+async def update_batch(batch_id: str, patch: Dict[str, Any]) -> Dict[str, Any]:
+    return await run_db(api.update_batch, batch_id, patch)
+
+
+async def apply_batch_edits(edits: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return await run_db(api.apply_batch_edits, edits)
+
+
+async def consume_batch(batch_id: str, delta_quantity: float, note: str = "") -> Dict[str, Any]:
+    return await run_db(api.consume_batch, batch_id, delta_quantity, note)
+
+
+async def discard_batch(batch_id: str, delta_quantity: float, reason: str = "") -> Dict[str, Any]:
+    return await run_db(api.discard_batch, batch_id, delta_quantity, reason)
+
+
+async def list_events(limit: int = 10) -> Dict[str, Any]:
+    return await run_db(api.list_events, limit)
+
+
+async def list_events_page(before: Optional[Tuple[str, str]] = None, limit: int = 20) -> Dict[str, Any]:
+    return await run_db(api.list_events_page, before=before, limit=limit)
+
+
+async def list_batch_events(batch_id: str) -> Dict[str, Any]:
+    return await run_db(api.list_batch_events, batch_id)
+
+
+async def rollup_events(retention_days: Optional[int] = None) -> Dict[str, Any]:
+    return await run_db(api.rollup_events, retention_days)
+
+
+async def archive_finished_batches(grace_days: Optional[int] = None) -> Dict[str, Any]:
+    return await run_db(api.archive_finished_batches, grace_days)
+
+
+async def list_event_daily(since: Optional[str] = None, item_id: Optional[int] = None) -> Dict[str, Any]:
+    return await run_db(api.list_event_daily, since, item_id)
+
+
+async def dashboard_summary() -> Dict[str, Any]:
+    return await run_db(api.dashboard_summary)
+
+
+async def list_expiring(days: int = 3, limit: Optional[int] = None) -> Dict[str, Any]:
+    return await run_db(api.list_expiring, days, limit)
+
+
+async def _generate(planner: str, days: int, servings: int, constraints: Dict[str, Any]) -> Dict[str, Any]:
+    provider = await run_db(get_planner, planner)
+    if not isinstance(provider, HttpPlannerProvider):
+        return await run_db(provider.generate, days, servings, constraints)
+    request, context = await run_db(provider.build_request, days, servings, constraints)
+    status, text = await _post_json(request)
+    return await run_db(provider.parse_response, status, text, context)
+
+
+async def generate_menu(
+    days: int,
+    servings: int,
+    constraints: Dict[str, Any],
+    planner: str = "greedy",
+) -> Dict[str, Any]:
+    await run_db(api.ensure_initialized)
+    reason = ""
+    try:
+        result = await _generate(planner, days, servings, constraints)
+    except Exception as exc:  # noqa: BLE001
+        reason = api.degraded_reason(exc, "PLANNER_ERROR")
+        result = await run_db(get_planner(api.FALLBACK_PLANNER).generate, days, servings, constraints)
+    return {**result, "meta": api.fallback_meta("planner", planner, api.FALLBACK_PLANNER, reason)}
+
+
+async def get_menu(menu_id: str) -> Dict[str, Any]:
+    return await run_db(api.get_menu, menu_id)
+
+
+async def get_menu_calories(menu_id: str) -> Dict[str, Any]:
+    return await run_db(api.get_menu_calories, menu_id)
+
+
+async def get_shopping_list(menu_id: str) -> Dict[str, Any]:
+    return await run_db(api.get_shopping_list, menu_id)
+
+
+async def set_shopping_items_checked(menu_id: str, item_ids: Optional[List[str]], checked: bool) -> Dict[str, Any]:
+    return await run_db(api.set_shopping_items_checked, menu_id, item_ids, checked)
+
+
+async def set_shopping_items_checked_state(menu_id: str, checked_ids: List[str]) -> Dict[str, Any]:
+    return await run_db(api.set_shopping_items_checked_state, menu_id, checked_ids)
+
+
+async def update_shopping_item_checked(item_id: str, checked: bool) -> Dict[str, Any]:
+    return await run_db(api.update_shopping_item_checked, item_id, checked)
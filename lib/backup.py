@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from . import db
+
+# =========================
+# Online snapshots of the live database (default or household shard)
+# - sqlite3 Connection.backup copies BACKUP_PAGES pages per step and sleeps BACKUP_SLEEP between steps,
+#   so the writer thread and readers keep running while a snapshot is taken
+# - the source connection holds one read transaction for the whole copy: in WAL mode writers carry on,
+#   and the snapshot is consistent as of that moment instead of restarting on every commit
+# - each snapshot is written to a .part file, checked with PRAGMA quick_check, then renamed into place
+# - the newest BACKUP_KEEP snapshots per database are kept
+# =========================
+
+BACKUP_DIR = os.getenv("SMART_FRIDGE_BACKUP_DIR")
+BACKUP_KEEP = int(os.getenv("SMART_FRIDGE_BACKUP_KEEP", "7"))
+BACKUP_PAGES = int(os.getenv("SMART_FRIDGE_BACKUP_PAGES", "256"))
+BACKUP_SLEEP = float(os.getenv("SMART_FRIDGE_BACKUP_SLEEP", "0.005"))
+
+SNAPSHOT_TIME_FMT = "%Y%m%dT%H%M%S%f"
+
+Progress = Callable[[int, int], None]
+
+
+class BackupCheckFailed(sqlite3.DatabaseError):
+    """A snapshot failed PRAGMA quick_check; ``problems`` holds the reported rows."""
+
+    def __init__(self, path: Path, problems: List[str]) -> None:
+        super().__init__(f"{path}: {'; '.join(problems[:5])}")
+        self.path = path
+        self.problems = problems
+
+
+def backup_dir(source: Optional[Path] = None) -> Path:
+    """Where snapshots of ``source`` (default: the current database) are kept."""
+    source = Path(source or db.current_path())
+    base = Path(BACKUP_DIR) if BACKUP_DIR else source.parent / "backups"
+    return base / source.stem
+
+
+def quick_check(path: Path) -> List[str]:
+    """Run PRAGMA quick_check on ``path``; returns the problems found (empty when the file is ok)."""
+    conn = sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        rows = [row[0] for row in conn.execute("PRAGMA quick_check").fetchall()]
+    finally:
+        conn.close()
+    return [] if rows == ["ok"] else rows
+
+
+def _copy(
+    source: sqlite3.Connection,
+    dest_path: Path,
+    pages: int,
+    sleep: float,
+    progress: Optional[Progress],
+) -> int:
+    """Copy ``source`` into ``dest_path`` as a rollback-journal file; returns the page count."""
+    total = 0
+
+    def step(status: int, remaining: int, count: int) -> None:
+        nonlocal total
+        total = count
+        if progress is not None:
+            progress(count - remaining, count)
+        if sleep > 0 and remaining:
+            time.sleep(sleep)
+
+    dest = sqlite3.connect(dest_path)
+    try:
+        source.backup(dest, pages=pages, progress=step)
+        # The copied header still says WAL; a snapshot should be one self-contained file.
+        dest.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        dest.close()
+    return total
+
+
+def _checked_copy(
+    source: sqlite3.Connection,
+    target: Path,
+    pages: int,
+    sleep: float,
+    progress: Optional[Progress],
+) -> int:
+    part = target.with_name(target.name + ".part")
+    part.unlink(missing_ok=True)
+    try:
+        total = _copy(source, part, pages, sleep, progress)
+        problems = quick_check(part)
+        if problems:
+            raise BackupCheckFailed(target, problems)
+        part.replace(target)
+    finally:
+        part.unlink(missing_ok=True)
+    return total
+
+
+def list_backups(source: Optional[Path] = None) -> List[Dict[str, Any]]:
+    """Snapshots of ``source`` (default: the current database), newest first."""
+    folder = backup_dir(source)
+    if not folder.is_dir():
+        return []
+    snapshots = []
+    for path in sorted(folder.glob("*.db"), reverse=True):
+        stat = path.stat()
+        snapshots.append(
+            {
+                "path": str(path),
+                "size": stat.st_size,
+                "created_at": datetime.utcfromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M:%S"),
+            }
+        )
+    return snapshots
+
+
+def rotate(keep: Optional[int] = None, source: Optional[Path] = None) -> List[str]:
+    """Delete all but the newest ``keep`` snapshots; returns the removed paths."""
+    keep = BACKUP_KEEP if keep is None else keep
+    removed = []
+    for snapshot in list_backups(source)[max(0, keep):]:
+        Path(snapshot["path"]).unlink(missing_ok=True)
+        removed.append(snapshot["path"])
+    return removed
+
+
+def create_backup(
+    keep: Optional[int] = None,
+    pages: Optional[int] = None,
+    sleep: Optional[float] = None,
+    progress: Optional[Progress] = None,
+) -> Dict[str, Any]:
+    """Snapshot the current database while it stays in use, verify it, then rotate old snapshots.
+
+    ``pages=-1`` copies everything in one step (fastest, but readers and the
+    writer wait on the copy for its whole duration).
+    """
+    db.init_db()
+    source_path = db.current_path()
+    folder = backup_dir(source_path)
+    folder.mkdir(parents=True, exist_ok=True)
+    target = folder / f"{source_path.stem}-{datetime.utcnow().strftime(SNAPSHOT_TIME_FMT)}.db"
+    start = time.perf_counter()
+    source = db._connect(source_path, read_only=True)
+    try:
+        # Pin one read snapshot for the whole copy; see the header comment.
+        source.execute("BEGIN")
+        source.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone()
+        total = _checked_copy(
+            source,
+            target,
+            BACKUP_PAGES if pages is None else pages,
+            BACKUP_SLEEP if sleep is None else sleep,
+            progress,
+        )
+    finally:
+        source.close()
+    return {
+        "path": str(target),
+        "pages": total,
+        "seconds": round(time.perf_counter() - start, 3),
+        "removed": rotate(keep, source_path),
+    }
+
+
+def restore(snapshot: Path, target: Path, pages: Optional[int] = None) -> Dict[str, Any]:
+    """Copy ``snapshot`` into a new database file at ``target``.
+
+    The live database is never overwritten: ``target`` must not exist yet.
+    Older snapshots are migrated the first time the restored file is opened.
+    """
+    snapshot, target = Path(snapshot), Path(target)
+    if not snapshot.is_file():
+        raise FileNotFoundError(snapshot)
+    if target.exists():
+        raise FileExistsError(target)
+    problems = quick_check(snapshot)
+    if problems:
+        raise BackupCheckFailed(snapshot, problems)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    source = sqlite3.connect(f"{snapshot.resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        total = _checked_copy(source, target, BACKUP_PAGES if pages is None else pages, 0.0, None)
+    finally:
+        source.close()
+    return {"path": str(target), "pages": total}
@@ -0,0 +1,453 @@
+from __future__ import annotations
+
+import csv
+import json
+import sqlite3
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import db
+from .utils import DATETIME_FMT, format_date, now_ts, parse_date, to_json
+
+# =========================
+# Streaming CSV / JSONL import and export
+# - rows are read, validated and written chunk_size at a time: memory stays flat for any file size
+# - each chunk is one BEGIN IMMEDIATE transaction of executemany calls
+# - upsert by natural key: items/recipes by name, recipe_ingredients by (recipe_name, item_name),
+#   inventory_batches by batch_id, inventory_events by event_id
+# - inventory_batches / inventory_events exports cover the hot tables only unless include_archive is set:
+#   finished batches and rolled-up events live in the *_archive tables (an archive-inclusive export
+#   re-imports everything into the hot tables)
+# =========================
+
+CHUNK_SIZE = 1000
+MAX_ERROR_SAMPLES = 20
+
+Progress = Callable[[int, int], None]
+
+
+def _text(value: Any) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    return str(value)
+
+
+def _int(value: Any) -> Optional[int]:
+    if value is None or value == "":
+        return None
+    return int(float(value))
+
+
+def _float(value: Any) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    return float(value)
+
+
+def _date(value: Any) -> Optional[str]:
+    """A DATE_FMT date, normalized (``2024-1-5`` -> ``2024-01-05``)."""
+    if value is None or value == "":
+        return None
+    return format_date(parse_date(str(value).strip()))
+
+
+def _timestamp(value: Any) -> Optional[str]:
+    """A DATETIME_FMT timestamp (UTC, like now_ts), normalized."""
+    if value is None or value == "":
+        return None
+    return datetime.strptime(str(value).strip(), DATETIME_FMT).strftime(DATETIME_FMT)
+
+
+BATCH_STATUSES = ("in_stock",) + db.FINISHED_STATUSES
+
+
+def _status(value: Any) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    if value not in BATCH_STATUSES:
+        raise ValueError(f"'{value}' is not one of {', '.join(BATCH_STATUSES)}")
+    return str(value)
+
+
+def _flag(value: Any) -> int:
+    if isinstance(value, str):
+        return 1 if value.strip().lower() in ("1", "true", "yes", "y") else 0
+    return 1 if value else 0
+
+
+def _json_text(value: Any) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, (dict, list)):
+        return to_json(value)
+    json.loads(value)
+    return str(value)
+
+
+# Column order is the file layout; required columns must be present and non-empty.
+TABLES: Dict[str, Dict[str, Any]] = {
+    "items": {
+        "columns": {"name": _text, "category": _text, "default_unit": _text, "shelf_life_days_default": _int},
+        "required": ("name", "default_unit"),
+        "export": "SELECT name, category, default_unit, shelf_life_days_default FROM items ORDER BY item_id",
+    },
+    "recipes": {
+        "columns": {"name": _text, "tags": _text, "allergens": _text, "steps": _text, "nutrition_json": _json_text},
+        "required": ("name",),
+        "export": "SELECT name, tags, allergens, steps, nutrition_json FROM recipes ORDER BY recipe_id",
+    },
+    "recipe_ingredients": {
+        "columns": {"recipe_name": _text, "item_name": _text, "quantity": _float, "unit": _text, "optional": _flag},
+        "required": ("recipe_name", "item_name", "quantity", "unit"),
+        "export": """
+            SELECT r.name AS recipe_name, i.name AS item_name, ri.quantity, ri.unit, ri.optional
+            FROM recipe_ingredients ri
+            JOIN recipes r ON r.recipe_id = ri.recipe_id
+            JOIN items i ON i.item_id = ri.item_id
+            ORDER BY ri.recipe_id, ri.rowid
+        """,
+    },
+    "inventory_batches": {
+        "columns": {
+            "batch_id": _text,
+            "item_id": _int,
+            "item_name_snapshot": _text,
+            "quantity": _float,
+            "unit": _text,
+            "purchase_date": _date,
+            "expire_date": _date,
+            "location": _text,
+            "status": _status,
+            "source_type": _text,
+            "source_ref_id": _text,
+            "created_at": _timestamp,
+            "updated_at": _timestamp,
+        },
+        "required": ("batch_id", "item_name_snapshot", "quantity", "unit"),
+        "export": f"SELECT {', '.join(db.BATCH_COLUMNS)} FROM inventory_batches ORDER BY rowid",
+        "export_archive": f"""
+            SELECT {', '.join(db.BATCH_COLUMNS)} FROM (
+                SELECT {', '.join(db.BATCH_COLUMNS)}, 0 AS tier, rowid AS seq FROM inventory_batches_archive
+                UNION ALL
+                SELECT {', '.join(db.BATCH_COLUMNS)}, 1 AS tier, rowid AS seq FROM inventory_batches
+            )
+            ORDER BY tier, seq
+        """,
+    },
+    "inventory_events": {
+        "columns": {
+            "event_id": _text,
+            "batch_id": _text,
+            "event_type": _text,
+            "delta_quantity": _float,
+            "note": _text,
+            "actor": _text,
+            "created_at": _timestamp,
+        },
+        "required": ("event_id", "batch_id", "event_type"),
+        "export": f"SELECT {db.EVENT_COLUMNS} FROM inventory_events ORDER BY created_at, event_id",
+        "export_archive": f"""
+            SELECT {db.EVENT_COLUMNS} FROM inventory_events
+            UNION ALL
+            SELECT {db.EVENT_COLUMNS} FROM inventory_events_archive
+            ORDER BY created_at, event_id
+        """,
+    },
+}
+
+
+def _format(path: Path, fmt: Optional[str]) -> str:
+    fmt = (fmt or path.suffix.lstrip(".")).lower()
+    if fmt == "ndjson":
+        fmt = "jsonl"
+    if fmt not in ("csv", "jsonl"):
+        raise ValueError(f"Unsupported format '{fmt}' for {path}; use csv or jsonl")
+    return fmt
+
+
+def _spec(table: str) -> Dict[str, Any]:
+    if table not in TABLES:
+        raise ValueError(f"Unknown table '{table}'; expected one of {', '.join(TABLES)}")
+    return TABLES[table]
+
+
+def read_rows(path: Path, fmt: Optional[str] = None) -> Iterator[Tuple[int, Optional[Dict[str, Any]]]]:
+    """Yield ``(line_number, row)`` lazily; unparsable JSONL lines come through as ``None``."""
+    path = Path(path)
+    if _format(path, fmt) == "csv":
+        with path.open(newline="", encoding="utf-8-sig") as handle:
+            reader = csv.DictReader(handle)
+            for row in reader:
+                yield reader.line_num, row
+        return
+    with path.open(encoding="utf-8") as handle:
+        for line_number, line in enumerate(handle, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+
+
+def validate_row(table: str, row: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Coerce one raw row to the table's columns; raises ValueError describing the first problem."""
+    if row is None:
+        raise ValueError("not a JSON object")
+    spec = _spec(table)
+    clean: Dict[str, Any] = {}
+    for column, convert in spec["columns"].items():
+        try:
+            clean[column] = convert(row.get(column))
+        except (TypeError, ValueError) as exc:
+            raise ValueError(f"{column}: {exc}") from exc
+    missing = [column for column in spec["required"] if clean.get(column) is None]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    return clean
+
+
+def _ids_by_name(conn: sqlite3.Connection, table: str, key: str, names: Iterable[str]) -> Dict[str, int]:
+    rows = conn.execute(
+        f"SELECT name, {key} FROM {table} WHERE name IN (SELECT value FROM json_each(?))",
+        (json.dumps(sorted(set(names)), ensure_ascii=False),),
+    )
+    return {name: row_id for name, row_id in rows}
+
+
+def _existing(conn: sqlite3.Connection, table: str, key: str, values: Iterable[Any]) -> set:
+    rows = conn.execute(
+        f"SELECT {key} FROM {table} WHERE {key} IN (SELECT value FROM json_each(?))",
+        (json.dumps(sorted(set(values)), ensure_ascii=False),),
+    )
+    return {value for (value,) in rows}
+
+
+def _write_items(conn: sqlite3.Connection, rows: List[Tuple[int, Dict[str, Any]]]) -> List[Tuple[int, str]]:
+    by_name = {row["name"]: row for _, row in rows}
+    existing = _ids_by_name(conn, "items", "item_id", by_name)
+    conn.executemany(
+        "UPDATE items SET category = ?, default_unit = ?, shelf_life_days_default = ? WHERE name = ?",
+        [
+            (row["category"], row["default_unit"], row["shelf_life_days_default"], name)
+            for name, row in by_name.items()
+            if name in existing
+        ],
+    )
+    conn.executemany(
+        "INSERT INTO items(name, category, default_unit, shelf_life_days_default) VALUES (?, ?, ?, ?)",
+        [
+            (name, row["category"], row["default_unit"], row["shelf_life_days_default"])
+            for name, row in by_name.items()
+            if name not in existing
+        ],
+    )
+    return []
+
+
+def _write_recipes(conn: sqlite3.Connection, rows: List[Tuple[int, Dict[str, Any]]]) -> List[Tuple[int, str]]:
+    by_name = {row["name"]: row for _, row in rows}
+    existing = _ids_by_name(conn, "recipes", "recipe_id", by_name)
+    conn.executemany(
+        "UPDATE recipes SET tags = ?, allergens = ?, steps = ?, nutrition_json = ? WHERE name = ?",
+        [
+            (row["tags"], row["allergens"], row["steps"], row["nutrition_json"] or "{}", name)
+            for name, row in by_name.items()
+            if name in existing
+        ],
+    )
+    conn.executemany(
+        "INSERT INTO recipes(name, tags, allergens, steps, nutrition_json) VALUES (?, ?, ?, ?, ?)",
+        [
+            (name, row["tags"], row["allergens"], row["steps"], row["nutrition_json"] or "{}")
+            for name, row in by_name.items()
+            if name not in existing
+        ],
+    )
+    return []
+
+
+def _write_recipe_ingredients(conn: sqlite3.Connection, rows: List[Tuple[int, Dict[str, Any]]]) -> List[Tuple[int, str]]:
+    recipe_ids = _ids_by_name(conn, "recipes", "recipe_id", (row["recipe_name"] for _, row in rows))
+    item_ids = _ids_by_name(conn, "items", "item_id", (row["item_name"] for _, row in rows))
+    rejected: List[Tuple[int, str]] = []
+    pairs: Dict[Tuple[int, int], Dict[str, Any]] = {}
+    for line, row in rows:
+        if row["recipe_name"] not in recipe_ids:
+            rejected.append((line, f"unknown recipe '{row['recipe_name']}'"))
+        elif row["item_name"] not in item_ids:
+            rejected.append((line, f"unknown item '{row['item_name']}'"))
+        else:
+            pairs[(recipe_ids[row["recipe_name"]], item_ids[row["item_name"]])] = row
+    conn.executemany("DELETE FROM recipe_ingredients WHERE recipe_id = ? AND item_id = ?", list(pairs))
+    conn.executemany(
+        "INSERT INTO recipe_ingredients(recipe_id, item_id, quantity, unit, optional) VALUES (?, ?, ?, ?, ?)",
+        [
+            (recipe_id, item_id, row["quantity"], row["unit"], row["optional"])
+            for (recipe_id, item_id), row in pairs.items()
+        ],
+    )
+    return rejected
+
+
+def _write_batches(conn: sqlite3.Connection, rows: List[Tuple[int, Dict[str, Any]]]) -> List[Tuple[int, str]]:
+    known_items = _existing(conn, "items", "item_id", (row["item_id"] for _, row in rows if row["item_id"] is not None))
+    rejected: List[Tuple[int, str]] = []
+    params = []
+    ts = now_ts()
+    for line, row in rows:
+        if row["item_id"] is not None and row["item_id"] not in known_items:
+            rejected.append((line, f"unknown item_id {row['item_id']}"))
+            continue
+        params.append(
+            tuple(row[column] for column in db.BATCH_COLUMNS[:8])
+            + (
+                row["status"] or "in_stock",
+                row["source_type"] or "import",
+                row["source_ref_id"],
+                row["created_at"] or ts,
+                row["updated_at"] or ts,
+            )
+        )
+    updates = ", ".join(f"{column} = excluded.{column}" for column in db.BATCH_COLUMNS[1:])
+    conn.executemany(
+        f"INSERT INTO inventory_batches({', '.join(db.BATCH_COLUMNS)}) "
+        f"VALUES ({', '.join('?' for _ in db.BATCH_COLUMNS)}) "
+        f"ON CONFLICT(batch_id) DO UPDATE SET {updates}",
+        params,
+    )
+    return rejected
+
+
+def _write_events(conn: sqlite3.Connection, rows: List[Tuple[int, Dict[str, Any]]]) -> List[Tuple[int, str]]:
+    known_batches = _existing(conn, "inventory_batches", "batch_id", (row["batch_id"] for _, row in rows))
+    rejected: List[Tuple[int, str]] = []
+    params = []
+    ts = now_ts()
+    for line, row in rows:
+        if row["batch_id"] not in known_batches:
+            rejected.append((line, f"unknown batch_id {row['batch_id']}"))
+            continue
+        params.append(
+            (
+                row["event_id"],
+                row["batch_id"],
+                row["event_type"],
+                row["delta_quantity"],
+                row["note"],
+                row["actor"] or "import",
+                row["created_at"] or ts,
+            )
+        )
+    conn.executemany(
+        f"{db.EVENT_INSERT_SQL} ON CONFLICT(event_id) DO UPDATE SET "
+        "batch_id = excluded.batch_id, event_type = excluded.event_type, delta_quantity = excluded.delta_quantity, "
+        "note = excluded.note, actor = excluded.actor, created_at = excluded.created_at",
+        params,
+    )
+    return rejected
+
+
+WRITERS = {
+    "items": _write_items,
+    "recipes": _write_recipes,
+    "recipe_ingredients": _write_recipe_ingredients,
+    "inventory_batches": _write_batches,
+    "inventory_events": _write_events,
+}
+
+
+def import_rows(
+    table: str,
+    rows: Iterable[Tuple[int, Optional[Dict[str, Any]]]],
+    chunk_size: int = CHUNK_SIZE,
+    progress: Optional[Progress] = None,
+) -> Dict[str, Any]:
+    """Validate and upsert ``(line_number, row)`` pairs, one transaction per chunk.
+
+    Invalid rows are skipped and counted; the first MAX_ERROR_SAMPLES are returned with their line numbers.
+    """
+    _spec(table)
+    db.init_db()
+    writer = WRITERS[table]
+    report: Dict[str, Any] = {"table": table, "read": 0, "written": 0, "rejected": 0, "errors": []}
+
+    def reject(line: int, message: str) -> None:
+        report["rejected"] += 1
+        if len(report["errors"]) < MAX_ERROR_SAMPLES:
+            report["errors"].append({"line": line, "error": message})
+
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            break
+        report["read"] += len(chunk)
+        valid: List[Tuple[int, Dict[str, Any]]] = []
+        for line, row in chunk:
+            try:
+                valid.append((line, validate_row(table, row)))
+            except ValueError as exc:
+                reject(line, str(exc))
+        if valid:
+            with db.transaction() as conn:
+                rejected = writer(conn, valid)
+            for line, message in rejected:
+                reject(line, message)
+            report["written"] += len(valid) - len(rejected)
+        if progress:
+            progress(report["read"], report["rejected"])
+    return report
+
+
+def import_file(
+    table: str,
+    path: Path,
+    fmt: Optional[str] = None,
+    chunk_size: int = CHUNK_SIZE,
+    progress: Optional[Progress] = None,
+) -> Dict[str, Any]:
+    report = import_rows(table, read_rows(Path(path), fmt), chunk_size=chunk_size, progress=progress)
+    report["path"] = str(path)
+    return report
+
+
+def export_file(
+    table: str,
+    path: Path,
+    fmt: Optional[str] = None,
+    chunk_size: int = CHUNK_SIZE,
+    progress: Optional[Progress] = None,
+    include_archive: bool = False,
+) -> int:
+    """Stream ``table`` to a CSV or JSONL file; returns the number of rows written.
+
+    Without ``include_archive`` batch and event exports are partial: archived
+    batches and events are left out.
+    """
+    spec = _spec(table)
+    query = spec.get("export_archive", spec["export"]) if include_archive else spec["export"]
+    path = Path(path)
+    fmt = _format(path, fmt)
+    db.init_db()
+    columns = list(spec["columns"])
+    written = 0
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", newline="", encoding="utf-8") as handle, db.read_snapshot():
+        csv_writer = csv.DictWriter(handle, fieldnames=columns) if fmt == "csv" else None
+        if csv_writer:
+            csv_writer.writeheader()
+        for row in db.iter_rows(query, chunk_size=chunk_size):
+            if csv_writer:
+                csv_writer.writerow(row)
+            else:
+                handle.write(json.dumps(row, ensure_ascii=False) + "\n")
+            written += 1
+            if progress and written % chunk_size == 0:
+                progress(written, 0)
+    if progress:
+        progress(written, 0)
+    return written
@@ -1,52 +1,951 @@
 from __future__ import annotations
 
+import atexit
+import json
+import os
+import queue
+import re
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from .utils import DATETIME_FMT, from_json, now_ts, to_json
+from .schemas import InventoryBatchRecord, RecipeIngredientRecord, RecipeRecord
+from .utils import DATETIME_FMT, add_days, day_number, format_date, from_json, now_ts, to_json, today, ts_days_ago, utc_today
 
 BASE_DIR = Path(__file__).resolve().parents[1]
 DB_PATH = BASE_DIR / "data" / "smart_fridge.db"
 SCHEMA_PATH = BASE_DIR / "db" / "schema.sql"
+MIGRATIONS_DIR = BASE_DIR / "db" / "migrations"
 
+POOL_MAX_SIZE = int(os.getenv("SMART_FRIDGE_DB_POOL_SIZE", "8"))
+# Pooled connections idle for longer than this are pinged before reuse.
+HEALTH_CHECK_INTERVAL = 30.0
+# WAL lets readers (snapshots below) run alongside a writer instead of hitting "database is locked".
+JOURNAL_MODE = os.getenv("SMART_FRIDGE_DB_JOURNAL_MODE", "WAL")
+# Events older than this many days are rolled up and moved out of inventory_events.
+EVENT_RETENTION_DAYS = int(os.getenv("SMART_FRIDGE_EVENT_RETENTION_DAYS", "90"))
+# Database files (default + household shards) kept open at once; least recently used are closed first.
+MAX_OPEN_DATABASES = int(os.getenv("SMART_FRIDGE_MAX_OPEN_DATABASES", "32"))
+# All writes go through one writer thread per database file (see WriteQueue); "0" writes on the caller's thread.
+WRITE_QUEUE = os.getenv("SMART_FRIDGE_WRITE_QUEUE", "1") != "0"
+WRITE_QUEUE_SIZE = int(os.getenv("SMART_FRIDGE_WRITE_QUEUE_SIZE", "1024"))
+# Queued writes committed together in one transaction, at most.
+WRITE_GROUP_MAX = int(os.getenv("SMART_FRIDGE_WRITE_GROUP_MAX", "64"))
+# Seconds a caller waits for room in a full queue before WriteQueueFull.
+WRITE_QUEUE_TIMEOUT = float(os.getenv("SMART_FRIDGE_WRITE_QUEUE_TIMEOUT", "30"))
+# A writer thread with nothing to do for this long closes its connection and exits; the next write restarts it.
+WRITER_IDLE_SECONDS = 5.0
+# Read-through cache for cached_fetch_all (see QueryCache); results over QUERY_CACHE_MAX_ROWS are not kept.
+QUERY_CACHE_SIZE = int(os.getenv("SMART_FRIDGE_QUERY_CACHE_SIZE", "256"))
+QUERY_CACHE_MAX_ROWS = int(os.getenv("SMART_FRIDGE_QUERY_CACHE_MAX_ROWS", "5000"))
 
-def get_connection() -> sqlite3.Connection:
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+_HOUSEHOLD_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+_household: ContextVar[Optional[str]] = ContextVar("smart_fridge_household", default=None)
+
+
+def household_path(household_id: str) -> Path:
+    if not _HOUSEHOLD_ID.match(household_id or ""):
+        raise ValueError(f"invalid household id: {household_id!r}")
+    # Shards live next to the default database, so pointing DB_PATH elsewhere moves them too.
+    return Path(DB_PATH).parent / "households" / f"{household_id}.db"
+
+
+def current_household() -> Optional[str]:
+    return _household.get()
+
+
+def current_path() -> Path:
+    """The database file for the active household, or ``DB_PATH`` outside any household."""
+    household_id = _household.get()
+    return Path(DB_PATH) if household_id is None else household_path(household_id)
+
+
+@contextmanager
+def household(household_id: Optional[str]) -> Iterator[Optional[str]]:
+    """Route every db call made inside the block to ``household_id``'s own database file.
+
+    ``None`` selects the shared default database. The selection lives in a
+    ContextVar, so it follows asyncio tasks and ``contextvars.copy_context``.
+    """
+    if household_id is not None:
+        household_path(household_id)
+    token = _household.set(household_id)
+    try:
+        yield household_id
+    finally:
+        _household.reset(token)
+
+
+def _connect(path: Path, read_only: bool = False) -> sqlite3.Connection:
+    # The pool guarantees a connection is only used by one thread at a time;
+    # check_same_thread is relaxed so finished threads' connections can be
+    # handed on and closed at shutdown.
+    if read_only:
+        conn = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False)
+    else:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("PRAGMA foreign_keys = ON")
+        # In WAL mode NORMAL only syncs at checkpoints and is still corruption-safe.
+        conn.execute("PRAGMA synchronous = NORMAL")
     conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON")
     return conn
 
 
+class ConnectionPool:
+    """Long-lived SQLite connections, one per thread, capped at ``max_size``.
+
+    Streamlit runs every rerun on a fresh script thread, so connections owned
+    by threads that have exited are reclaimed and handed to the next thread
+    instead of being reopened.
+    """
+
+    def __init__(self, path: Path, max_size: int = POOL_MAX_SIZE, read_only: bool = False) -> None:
+        self.path = path
+        self.max_size = max(1, max_size)
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._owned: Dict[int, Tuple[threading.Thread, sqlite3.Connection]] = {}
+        self._idle: List[sqlite3.Connection] = []
+        self._last_used: Dict[int, float] = {}
+        self._leases = 0
+        self._closed = False
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._owned) + len(self._idle)
+
+    def in_use(self) -> bool:
+        """True while a leased connection is checked out."""
+        with self._lock:
+            return self._leases > 0
+
+    def acquire(self, lease: bool = False) -> Optional[sqlite3.Connection]:
+        """Return the calling thread's connection, or ``None`` if the pool is full.
+
+        With ``lease=True`` the pool will not close the connection until the
+        matching ``release()``, even if it is closed (evicted) meanwhile.
+        """
+        thread = threading.current_thread()
+        ident = threading.get_ident()
+        with self._lock:
+            if self._closed:
+                return None
+            owned = self._owned.pop(ident, None)
+            if owned is not None and owned[0] is thread:
+                conn = owned[1]
+            else:
+                if owned is not None:
+                    # Thread id reused by a new thread: the previous owner is gone.
+                    self._idle.append(owned[1])
+                self._reclaim_locked()
+                if self._idle:
+                    conn = self._idle.pop()
+                elif len(self._owned) < self.max_size:
+                    conn = _connect(self.path, self.read_only)
+                    self._last_used[id(conn)] = time.monotonic()
+                else:
+                    return None
+            self._owned[ident] = (thread, conn)
+            if lease:
+                self._leases += 1
+        conn = self._check_health(ident, thread, conn)
+        self._last_used[id(conn)] = time.monotonic()
+        return conn
+
+    def _reclaim_locked(self) -> None:
+        for ident, (thread, conn) in list(self._owned.items()):
+            if not thread.is_alive():
+                del self._owned[ident]
+                self._idle.append(conn)
+
+    def _check_health(self, ident: int, thread: threading.Thread, conn: sqlite3.Connection) -> sqlite3.Connection:
+        last_used = self._last_used.get(id(conn), 0.0)
+        if time.monotonic() - last_used < HEALTH_CHECK_INTERVAL:
+            return conn
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return conn
+        except sqlite3.Error:
+            self._last_used.pop(id(conn), None)
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            fresh = _connect(self.path, self.read_only)
+            with self._lock:
+                self._owned[ident] = (thread, fresh)
+            return fresh
+
+    def release(self) -> None:
+        with self._lock:
+            self._leases -= 1
+            drain = self._closed and self._leases == 0
+        if drain:
+            self._close_connections()
+
+    def close(self) -> None:
+        """Stop handing out connections; open ones are closed once no lease is outstanding."""
+        with self._lock:
+            self._closed = True
+            drain = self._leases == 0
+        if drain:
+            self._close_connections()
+
+    def _close_connections(self) -> None:
+        with self._lock:
+            conns = [conn for _, conn in self._owned.values()] + self._idle
+            self._owned.clear()
+            self._idle.clear()
+            self._last_used.clear()
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+
+# Pools per (file, read_only), ordered least recently used first; see MAX_OPEN_DATABASES.
+# Evicting a file also closes its writer thread and forgets its init_db() / query-cache state;
+# files still in use are left open until a later eviction pass (see _retire_locked).
+_pools: "OrderedDict[Tuple[Path, bool], ConnectionPool]" = OrderedDict()
+_pools_lock = threading.Lock()
+
+
+def get_pool(read_only: bool = False) -> ConnectionPool:
+    key = (current_path(), read_only)
+    retired: List[Tuple[Path, List[ConnectionPool], Optional["WriteQueue"]]] = []
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(key[0], read_only=read_only)
+            _pools[key] = pool
+            retired = _retire_locked(key[0])
+        _pools.move_to_end(key)
+    # Closing joins the writer thread: never do it while holding the registries.
+    for path, pools, writer in retired:
+        if writer is not None:
+            writer.close()
+        for stale in pools:
+            stale.close()
+        _initialized.discard(path)
+        _query_cache.forget(path)
+    return pool
+
+
+def _retire_locked(keep: Path) -> List[Tuple[Path, List[ConnectionPool], Optional["WriteQueue"]]]:
+    """Unregister least recently used files beyond MAX_OPEN_DATABASES; the caller closes them.
+
+    Files with a leased connection or a writer that has work in hand are
+    skipped, so the cap may be exceeded until a later open finds them idle.
+    """
+    open_paths = list(OrderedDict.fromkeys(path for path, _ in _pools))
+    excess = len(open_paths) - max(1, MAX_OPEN_DATABASES)
+    retired = []
+    for path in open_paths:
+        if excess <= 0:
+            break
+        if path == keep:
+            continue
+        pools = [_pools[(path, ro)] for ro in (False, True) if (path, ro) in _pools]
+        with _writers_lock:
+            writer = _writers.get(path)
+            if any(stale.in_use() for stale in pools) or (writer is not None and not writer.idle()):
+                continue
+            _writers.pop(path, None)
+        for ro in (False, True):
+            _pools.pop((path, ro), None)
+        retired.append((path, pools, writer))
+        excess -= 1
+    return retired
+
+
+def close_all() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
+    for pool in pools:
+        pool.close()
+    _query_cache.close()
+
+
+atexit.register(close_all)
+
+
+@contextmanager
+def _connection() -> Iterator[sqlite3.Connection]:
+    pool = get_pool()
+    conn = pool.acquire(lease=True)
+    if conn is not None:
+        try:
+            yield conn
+        finally:
+            pool.release()
+        return
+    # Pool exhausted: serve this call from a short-lived connection.
+    conn = _connect(pool.path)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+_snapshot = threading.local()
+
+
+@contextmanager
+def read_snapshot() -> Iterator[sqlite3.Connection]:
+    """Serve every read on this thread from one ``mode=ro`` connection and one consistent snapshot.
+
+    Under WAL the snapshot neither blocks nor waits for writers. Reads inside
+    the block see the database as of its first query; writes still go through
+    the read-write pool. Nested blocks share the outer snapshot. Consume
+    iter_* generators before the block exits.
+    """
+    current = getattr(_snapshot, "conn", None)
+    if current is not None:
+        yield current
+        return
+    pool = get_pool(read_only=True)
+    conn = pool.acquire(lease=True)
+    temporary = conn is None
+    if temporary:
+        conn = _connect(pool.path, read_only=True)
+    # Stamped before the snapshot's first read, so cached results are never older than their stamp.
+    _snapshot.stamp = _query_cache.stamp(pool.path)
+    conn.execute("BEGIN")
+    _snapshot.conn = conn
+    try:
+        yield conn
+    finally:
+        _snapshot.conn = None
+        _snapshot.stamp = None
+        conn.rollback()
+        if temporary:
+            conn.close()
+        else:
+            pool.release()
+
+
+@contextmanager
+def _read_connection() -> Iterator[sqlite3.Connection]:
+    # Inside a write, read through the writing connection so uncommitted changes are visible.
+    conn = getattr(_writing, "conn", None) or getattr(_snapshot, "conn", None)
+    if conn is not None:
+        yield conn
+        return
+    with _connection() as conn:
+        yield conn
+
+
+_ALL_TABLES = "*"
+_READ_TABLES = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)", re.I)
+_WRITE_TABLE = re.compile(
+    r"\b(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+(\w+)", re.I
+)
+Stamp = Tuple[int, Dict[str, int]]
+
+
+def _write_tables(query: str) -> Optional[Tuple[str, ...]]:
+    match = _WRITE_TABLE.match(query.strip())
+    return (match.group(1),) if match else None
+
+
+class QueryCache:
+    """fetch_all results keyed by (database file, query, params).
+
+    A hit is served only while its stamp is current. The stamp has two parts:
+    a per-database generation and a write counter for every table the query
+    reads. The generation is bumped when ``PRAGMA data_version`` on a watcher
+    connection shows a commit this process did not make through its writer
+    thread (another process, or WRITE_QUEUE off). The writer bumps the
+    counters of the tables it wrote after each group commit; trigger side
+    effects are included. A rerun with no writes costs one pragma.
+
+    Generations come from one process-wide clock, so a file whose state was
+    forgotten (evicted) never reissues a generation an older entry carries.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[Path, str, Tuple[Any, ...]], Tuple[int, Tuple[int, ...], List[Dict[str, Any]]]]" = OrderedDict()
+        self._clock = 0
+        self._generation: Dict[Path, int] = {}
+        self._counters: Dict[Path, Dict[str, int]] = {}
+        self._seen: Dict[Path, int] = {}
+        self._watchers: Dict[Path, sqlite3.Connection] = {}
+        self._triggered: Dict[Path, Dict[str, set]] = {}
+
+    def _data_version_locked(self, path: Path) -> int:
+        watcher = self._watchers.get(path)
+        if watcher is None:
+            watcher = self._watchers[path] = _connect(path, read_only=True)
+        return watcher.execute("PRAGMA data_version").fetchone()[0]
+
+    def _bump_locked(self, path: Path) -> None:
+        self._clock += 1
+        self._generation[path] = self._clock
+
+    def stamp(self, path: Path) -> Stamp:
+        with self._lock:
+            version = self._data_version_locked(path)
+            if self._seen.get(path) != version or path not in self._generation:
+                self._seen[path] = version
+                self._bump_locked(path)
+            return self._generation[path], dict(self._counters.get(path, {}))
+
+    def get(self, path: Path, query: str, params: Tuple[Any, ...], tables: Tuple[str, ...], stamp: Stamp) -> Optional[List[Dict[str, Any]]]:
+        key = (path, query, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[:2] != (stamp[0], tuple(stamp[1].get(table, 0) for table in tables)):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def put(self, path: Path, query: str, params: Tuple[Any, ...], tables: Tuple[str, ...], stamp: Stamp, rows: List[Dict[str, Any]]) -> None:
+        if len(rows) > QUERY_CACHE_MAX_ROWS or QUERY_CACHE_SIZE <= 0:
+            return
+        with self._lock:
+            self._entries[(path, query, params)] = (stamp[0], tuple(stamp[1].get(table, 0) for table in tables), rows)
+            while len(self._entries) > QUERY_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def _affected_locked(self, path: Path, tables: Iterable[str]) -> set:
+        """``tables`` plus everything their triggers write, transitively."""
+        triggered = self._triggered.get(path)
+        if triggered is None:
+            triggered = {}
+            watcher = self._watchers.get(path) or _connect(path, read_only=True)
+            self._watchers[path] = watcher
+            for table, sql in watcher.execute("SELECT tbl_name, sql FROM sqlite_master WHERE type = 'trigger'"):
+                body = re.split(r"\bBEGIN\b", sql, maxsplit=1, flags=re.I)[-1]
+                triggered.setdefault(table, set()).update(_WRITE_TABLE.findall(body))
+            self._triggered[path] = triggered
+        affected = set(tables)
+        pending = list(affected)
+        while pending:
+            for target in triggered.get(pending.pop(), ()):
+                if target not in affected:
+                    affected.add(target)
+                    pending.append(target)
+        return affected
+
+    def invalidate(self, path: Path) -> None:
+        with self._lock:
+            self._bump_locked(path)
+
+    def committed(self, path: Path, tables: Iterable[str]) -> None:
+        """Record a commit made by ``path``'s writer: bump what it wrote and absorb it into the watcher's baseline.
+
+        The caller must confirm afterwards (on the writing connection) that no
+        other commit slipped in between, and ``invalidate`` if one did.
+        """
+        tables = set(tables)
+        with self._lock:
+            if _ALL_TABLES in tables or path not in self._generation:
+                self._bump_locked(path)
+            else:
+                counters = self._counters.setdefault(path, {})
+                for table in self._affected_locked(path, tables):
+                    counters[table] = counters.get(table, 0) + 1
+            self._seen[path] = self._data_version_locked(path)
+
+    def forget(self, path: Path) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == path]:
+                del self._entries[key]
+            for state in (self._generation, self._counters, self._seen, self._triggered):
+                state.pop(path, None)
+            watcher = self._watchers.pop(path, None)
+        if watcher is not None:
+            watcher.close()
+
+    def close(self) -> None:
+        with self._lock:
+            paths = set(self._watchers) | {key[0] for key in self._entries}
+        for path in paths:
+            self.forget(path)
+
+
+_query_cache = QueryCache()
+
+
+def cached_fetch_all(query: str, params: Iterable[Any] = (), tables: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+    """fetch_all through the read-through QueryCache; ``tables`` defaults to the FROM/JOIN tables of ``query``."""
+    if getattr(_writing, "conn", None) is not None:
+        # Reads inside a write may see uncommitted rows: never cache them.
+        return fetch_all(query, params)
+    params = tuple(params)
+    path = current_path()
+    tables = tuple(sorted(set(tables or _READ_TABLES.findall(query))))
+    stamp = getattr(_snapshot, "stamp", None) or _query_cache.stamp(path)
+    rows = _query_cache.get(path, query, params, tables, stamp)
+    if rows is None:
+        rows = fetch_all(query, params)
+        _query_cache.put(path, query, params, tables, stamp, rows)
+    return [dict(row) for row in rows]
+
+
+class WriteQueueFull(sqlite3.OperationalError):
+    """The write queue stayed full for WRITE_QUEUE_TIMEOUT seconds."""
+
+
+class WriteQueueClosed(sqlite3.ProgrammingError):
+    """The write queue was closed before the job ran; the job had no effect."""
+
+
+# The connection the current thread is writing through (writer thread, or a transaction() block).
+_writing = threading.local()
+_STOP = object()
+
+
+class WriteQueue:
+    """Serializes every write to one database file through a single writer thread.
+
+    Callers submit ``job(conn)`` callables and get a Future. The writer drains
+    up to WRITE_GROUP_MAX queued jobs, runs each inside its own SAVEPOINT of
+    one BEGIN IMMEDIATE transaction and commits them together; a job that
+    raises only rolls back its own savepoint. Futures resolve after the
+    commit, so a result means the write is durable. ``submit`` blocks while
+    the queue is full and raises WriteQueueFull after WRITE_QUEUE_TIMEOUT.
+    Once closed, ``submit`` raises WriteQueueClosed, and jobs that slipped in
+    behind the stop request fail with it instead of waiting forever.
+    """
+
+    def __init__(self, path: Path, max_size: int = WRITE_QUEUE_SIZE, group_max: int = WRITE_GROUP_MAX) -> None:
+        self.path = path
+        self.group_max = max(1, group_max)
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, max_size))
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None
+        self._closed = False
+        self._drained = False
+        self._active = False
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def idle(self) -> bool:
+        """True when no job is queued or being committed."""
+        return not self._active and self._queue.empty()
+
+    def submit(self, job: Callable[[sqlite3.Connection], Any], tables: Optional[Iterable[str]] = None) -> Future:
+        """Queue ``job``; ``tables`` it writes keep unrelated cached reads valid (None: assume any table)."""
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise WriteQueueClosed(f"write queue for {self.path.name} is closed")
+        try:
+            self._queue.put((job, tuple(tables) if tables is not None else None, future), timeout=WRITE_QUEUE_TIMEOUT)
+        except queue.Full:
+            raise WriteQueueFull(f"write queue for {self.path.name} is full") from None
+        with self._lock:
+            if self._drained:
+                # close() already swept the queue and the writer is gone: nothing will run this job.
+                self._fail_leftovers_locked()
+                raise WriteQueueClosed(f"write queue for {self.path.name} is closed")
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name=f"smart-fridge-writer-{self.path.stem}", daemon=True)
+                self._thread.start()
+        return future
+
+    def close(self) -> None:
+        """Finish the writes queued so far, stop the writer thread and refuse new ones."""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+        with self._lock:
+            self._fail_leftovers_locked()
+            self._drained = True
+
+    def _fail_leftovers_locked(self) -> None:
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not _STOP and item[2].set_running_or_notify_cancel():
+                item[2].set_exception(WriteQueueClosed(f"write queue for {self.path.name} closed before the job ran"))
+
+    def _next_group(self) -> Optional[List[Tuple[Callable[[sqlite3.Connection], Any], Optional[Tuple[str, ...]], Future]]]:
+        try:
+            item = self._queue.get(timeout=WRITER_IDLE_SECONDS)
+            self._active = True
+        except queue.Empty:
+            with self._lock:
+                if self._queue.empty():
+                    self._thread = None
+                    return None
+            return []
+        group = []
+        while item is not _STOP:
+            group.append(item)
+            if len(group) >= self.group_max:
+                return group
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return group
+        with self._lock:
+            self._thread = None
+        # Run what was queued ahead of the stop request, then exit.
+        self._commit_group(group)
+        return None
+
+    def _run(self) -> None:
+        self._conn = _connect(self.path)
+        self._data_version = None
+        _writing.conn = self._conn
+        try:
+            while True:
+                try:
+                    group = self._next_group()
+                    if group is None:
+                        return
+                    if group:
+                        self._commit_group(group)
+                finally:
+                    self._active = False
+        finally:
+            _writing.conn = None
+            self._conn.close()
+
+    def _commit_group(self, group: List[Tuple[Callable[[sqlite3.Connection], Any], Optional[Tuple[str, ...]], Future]]) -> None:
+        if not group:
+            return
+        conn = self._conn
+        outcomes: List[Tuple[Future, Any, Optional[BaseException]]] = []
+        _writing.tables = set()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # data_version on the writing connection only moves for other connections' commits.
+            version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if version != self._data_version:
+                _query_cache.invalidate(self.path)
+            for job, tables, future in group:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                _note_writes(tables)
+                conn.execute("SAVEPOINT write_job")
+                try:
+                    result = job(conn)
+                except BaseException as exc:  # noqa: BLE001 - handed to the caller through its future
+                    conn.execute("ROLLBACK TO write_job")
+                    outcomes.append((future, None, exc))
+                else:
+                    outcomes.append((future, result, None))
+                conn.execute("RELEASE write_job")
+            conn.commit()
+            # Cached reads learn about this commit before any caller does. Had someone else committed
+            # since BEGIN, the watcher baseline just absorbed it too, so drop everything.
+            _query_cache.committed(self.path, _writing.tables)
+            self._data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if self._data_version != version:
+                _query_cache.invalidate(self.path)
+        except BaseException as exc:  # noqa: BLE001
+            if conn.in_transaction:
+                conn.rollback()
+            _query_cache.invalidate(self.path)
+            for _, _, future in group:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        finally:
+            _writing.tables = None
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+_writers: Dict[Path, WriteQueue] = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer() -> WriteQueue:
+    path = current_path()
+    get_pool()  # keeps this file in the MAX_OPEN_DATABASES LRU, which also evicts its writer
+    with _writers_lock:
+        writer = _writers.get(path)
+        if writer is None or writer.closed:
+            writer = WriteQueue(path)
+            _writers[path] = writer
+        return writer
+
+
+def submit_write(job: Callable[[sqlite3.Connection], Any]) -> Future:
+    """Queue ``job(conn)`` for the current database's writer; the Future resolves once it is committed.
+
+    Use ``future.add_done_callback`` for a callback, or ``asyncio.wrap_future`` to await it.
+    """
+    conn = getattr(_writing, "conn", None)
+    if conn is not None or not WRITE_QUEUE:
+        future: Future = Future()
+        try:
+            future.set_result(_write(job))
+        except BaseException as exc:  # noqa: BLE001
+            future.set_exception(exc)
+        return future
+    return _submit(job)
+
+
+def _submit(job: Callable[[sqlite3.Connection], Any], tables: Optional[Iterable[str]] = None) -> Future:
+    while True:
+        try:
+            return get_writer().submit(job, tables)
+        except WriteQueueClosed:
+            continue  # closed (e.g. evicted) under us; get_writer() hands out a fresh one
+
+
+def _note_writes(tables: Optional[Iterable[str]]) -> None:
+    pending = getattr(_writing, "tables", None)
+    if pending is not None:
+        pending.update(tables if tables is not None else (_ALL_TABLES,))
+
+
+def _write(job: Callable[[sqlite3.Connection], Any], tables: Optional[Iterable[str]] = None) -> Any:
+    """Run ``job(conn)`` as one write and return its result once committed; ``tables`` as in WriteQueue.submit."""
+    conn = getattr(_writing, "conn", None)
+    if conn is not None:
+        # Already inside a write (a queued job or a transaction() block): join it.
+        _note_writes(tables)
+        return job(conn)
+    if WRITE_QUEUE:
+        while True:
+            try:
+                return _submit(job, tables).result()
+            except WriteQueueClosed:
+                continue  # the job never ran; retry on a fresh writer
+    with transaction() as conn:
+        return job(conn)
+
+
+def get_connection() -> sqlite3.Connection:
+    conn = get_pool().acquire()
+    return conn if conn is not None else _connect(current_path())
+
+
+def migrations() -> List[Tuple[int, str, Path]]:
+    """Numbered schema steps: schema.sql is version 1, then db/migrations/NNNN_name.sql."""
+    steps = [(1, "baseline", SCHEMA_PATH)]
+    for path in sorted(MIGRATIONS_DIR.glob("[0-9]*.sql")):
+        version, _, name = path.stem.partition("_")
+        steps.append((int(version), name, path))
+    return steps
+
+
+def _split_statements(script: str) -> List[str]:
+    statements = []
+    buffer = ""
+    for line in script.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            statements.append(buffer.strip())
+            buffer = ""
+    return statements
+
+
+def migrate(conn: sqlite3.Connection) -> List[int]:
+    """Apply pending migrations, each in its own IMMEDIATE transaction.
+
+    The applied set is re-read under the write lock so two processes starting
+    against the same file never run a step twice.
+    """
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS schema_version("
+        "version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_at TEXT NOT NULL)"
+    )
+    done = {row[0] for row in conn.execute("SELECT version FROM schema_version")}
+    applied = []
+    for version, name, path in migrations():
+        if version in done:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if not conn.execute("SELECT 1 FROM schema_version WHERE version = ?", (version,)).fetchone():
+                for statement in _split_statements(path.read_text(encoding="utf-8")):
+                    conn.execute(statement)
+                conn.execute(
+                    "INSERT INTO schema_version(version, name, applied_at) VALUES (?, ?, ?)",
+                    (version, name, now_ts()),
+                )
+                applied.append(version)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return applied
+
+
+def schema_version() -> int:
+    row = fetch_one("SELECT MAX(version) AS version FROM schema_version")
+    return int(row["version"] or 0) if row else 0
+
+
+_initialized: set = set()
+_init_lock = threading.Lock()
+
+
 def init_db() -> None:
-    schema_sql = SCHEMA_PATH.read_text(encoding="utf-8")
-    with get_connection() as conn:
-        conn.executescript(schema_sql)
+    """Bring the current database (default or household shard) up to date, once per process and file."""
+    path = current_path()
+    if path in _initialized:
+        return
+    with _init_lock:
+        if path in _initialized:
+            return
+        with _connection() as conn:
+            migrate(conn)
+            # journal_mode is persistent in the file; readers opened with mode=ro cannot switch it.
+            conn.execute(f"PRAGMA journal_mode = {JOURNAL_MODE}")
+        _initialized.add(path)
 
 
 def fetch_all(query: str, params: Iterable[Any] = ()) -> List[Dict[str, Any]]:
-    with get_connection() as conn:
+    with _read_connection() as conn:
         rows = conn.execute(query, params).fetchall()
         return [dict(row) for row in rows]
 
 
 def fetch_one(query: str, params: Iterable[Any] = ()) -> Optional[Dict[str, Any]]:
-    with get_connection() as conn:
+    with _read_connection() as conn:
         row = conn.execute(query, params).fetchone()
         return dict(row) if row else None
 
 
+def iter_rows(query: str, params: Iterable[Any] = (), chunk_size: int = 500) -> Iterator[Dict[str, Any]]:
+    """Stream rows ``chunk_size`` at a time; the connection stays leased until exhausted."""
+    with _read_connection() as conn:
+        cursor = conn.execute(query, params)
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(row)
+        finally:
+            cursor.close()
+
+
+def iter_records(record_type: type, query: str, params: Iterable[Any] = (), chunk_size: int = 500) -> Iterator[Any]:
+    """Like ``iter_rows`` but yields ``record_type`` tuples (see lib.schemas.record_type).
+
+    The query must select exactly the record's fields, in order.
+    """
+    with _read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        try:
+            cursor.execute(query, params)
+            columns = tuple(col[0] for col in cursor.description)
+            if columns != tuple(record_type._fields):
+                raise ValueError(f"{record_type.__name__} expects columns {record_type._fields}, query returned {columns}")
+            make = record_type._make
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield from map(make, rows)
+        finally:
+            cursor.close()
+
+
+def fetch_records(record_type: type, query: str, params: Iterable[Any] = ()) -> List[Any]:
+    return list(iter_records(record_type, query, params))
+
+
+def _record_columns(record_type: type, alias: str = "") -> str:
+    return ", ".join(f"{alias}{name}" for name in record_type._fields)
+
+
 def execute(query: str, params: Iterable[Any] = ()) -> None:
-    with get_connection() as conn:
-        conn.execute(query, params)
-        conn.commit()
+    params = tuple(params)
+    _write(lambda conn: conn.execute(query, params), _write_tables(query))
 
 
 def execute_many(query: str, params_list: Iterable[Iterable[Any]]) -> None:
-    with get_connection() as conn:
-        conn.executemany(query, params_list)
-        conn.commit()
+    params_list = [tuple(params) for params in params_list]
+    _write(lambda conn: conn.executemany(query, params_list), _write_tables(query))
+
+
+@contextmanager
+def transaction() -> Iterator[sqlite3.Connection]:
+    """The writing connection inside BEGIN IMMEDIATE; commits on exit, rolls back on error.
+
+    With the write queue on, the writer thread hands its connection to this
+    block and waits for it, so the block is one job of a group commit and
+    returns once that commit is durable. Writes made inside the block join it.
+    """
+    current = getattr(_writing, "conn", None)
+    if current is not None:
+        yield current
+        return
+    if not WRITE_QUEUE:
+        path = current_path()
+        try:
+            with _connection() as conn, conn:
+                conn.execute("BEGIN IMMEDIATE")
+                _writing.conn = conn
+                try:
+                    yield conn
+                finally:
+                    _writing.conn = None
+        finally:
+            # The watcher sees this commit through data_version as well; this covers rollbacks racing a stamp.
+            _query_cache.invalidate(path)
+        return
+
+    handed = threading.Event()
+    finished = threading.Event()
+    lease: Dict[str, Any] = {}
+
+    def job(conn: sqlite3.Connection) -> None:
+        lease["conn"] = conn
+        handed.set()
+        finished.wait()
+        if "error" in lease:
+            raise lease["error"]
+
+    future = _submit(job)
+    while not handed.wait(0.05):
+        if future.done():
+            if isinstance(future.exception(), WriteQueueClosed):
+                future = _submit(job)
+            else:
+                future.result()
+    _writing.conn = lease["conn"]
+    try:
+        yield lease["conn"]
+    except BaseException as exc:
+        lease["error"] = exc
+        raise
+    finally:
+        _writing.conn = None
+        finished.set()
+    future.result()
 
 
 def upsert_image(image_id: str, file_path: str) -> None:
@@ -61,7 +960,7 @@ def get_image(image_id: str) -> Optional[Dict[str, Any]]:
 
 
 def list_items() -> List[Dict[str, Any]]:
-    return fetch_all("SELECT * FROM items ORDER BY name")
+    return cached_fetch_all("SELECT * FROM items ORDER BY name")
 
 
 def get_item_by_name(name: str) -> Optional[Dict[str, Any]]:
@@ -116,40 +1015,71 @@ def insert_recipe_ingredients(ingredients: List[Dict[str, Any]]) -> None:
 
 
 def list_recipes() -> List[Dict[str, Any]]:
-    return fetch_all("SELECT * FROM recipes ORDER BY recipe_id")
+    return cached_fetch_all("SELECT * FROM recipes ORDER BY recipe_id")
+
+
+def iter_recipes() -> Iterator[Dict[str, Any]]:
+    return iter_rows("SELECT * FROM recipes ORDER BY recipe_id")
+
+
+def get_recipes(recipe_ids: Iterable[Any]) -> Dict[int, Dict[str, Any]]:
+    rows = fetch_all(
+        "SELECT * FROM recipes WHERE recipe_id IN (SELECT value FROM json_each(?))",
+        (to_json(list(recipe_ids)),),
+    )
+    return {row["recipe_id"]: row for row in rows}
 
 
 def list_recipe_ingredients() -> List[Dict[str, Any]]:
     return fetch_all("SELECT * FROM recipe_ingredients")
 
 
-def insert_batch(batch: Dict[str, Any]) -> None:
-    execute(
-        """
-        INSERT INTO inventory_batches(
-            batch_id, item_id, item_name_snapshot, quantity, unit, purchase_date,
-            expire_date, location, status, source_type, source_ref_id, created_at, updated_at
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            batch["batch_id"],
-            batch.get("item_id"),
-            batch["item_name_snapshot"],
-            batch["quantity"],
-            batch["unit"],
-            batch.get("purchase_date"),
-            batch.get("expire_date"),
-            batch.get("location"),
-            batch.get("status", "in_stock"),
-            batch.get("source_type"),
-            batch.get("source_ref_id"),
-            batch.get("created_at"),
-            batch.get("updated_at"),
-        ),
+def iter_recipe_ingredients() -> Iterator[Dict[str, Any]]:
+    return iter_rows("SELECT * FROM recipe_ingredients")
+
+
+def iter_recipe_records() -> Iterator[Any]:
+    return iter_records(RecipeRecord, f"SELECT {_record_columns(RecipeRecord)} FROM recipes ORDER BY recipe_id")
+
+
+def iter_recipe_ingredient_records() -> Iterator[Any]:
+    return iter_records(
+        RecipeIngredientRecord,
+        f"SELECT {_record_columns(RecipeIngredientRecord)} FROM recipe_ingredients",
     )
 
 
-def update_batch(batch_id: str, patch: Dict[str, Any]) -> None:
+BATCH_INSERT_SQL = """
+INSERT INTO inventory_batches(
+    batch_id, item_id, item_name_snapshot, quantity, unit, purchase_date,
+    expire_date, location, status, source_type, source_ref_id, created_at, updated_at
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def _batch_params(batch: Dict[str, Any]) -> Tuple[Any, ...]:
+    return (
+        batch["batch_id"],
+        batch.get("item_id"),
+        batch["item_name_snapshot"],
+        batch["quantity"],
+        batch["unit"],
+        batch.get("purchase_date"),
+        batch.get("expire_date"),
+        batch.get("location"),
+        batch.get("status", "in_stock"),
+        batch.get("source_type"),
+        batch.get("source_ref_id"),
+        batch.get("created_at"),
+        batch.get("updated_at"),
+    )
+
+
+def insert_batch(batch: Dict[str, Any]) -> None:
+    execute(BATCH_INSERT_SQL, _batch_params(batch))
+
+
+def _update_batch_sql(batch_id: str, patch: Dict[str, Any]) -> Tuple[str, List[Any]]:
     fields = []
     values: List[Any] = []
     for key, value in patch.items():
@@ -158,46 +1088,356 @@ def update_batch(batch_id: str, patch: Dict[str, Any]) -> None:
     fields.append("updated_at = ?")
     values.append(now_ts())
     values.append(batch_id)
-    query = f"UPDATE inventory_batches SET {', '.join(fields)} WHERE batch_id = ?"
-    execute(query, values)
+    return f"UPDATE inventory_batches SET {', '.join(fields)} WHERE batch_id = ?", values
+
+
+def update_batch(batch_id: str, patch: Dict[str, Any]) -> None:
+    execute(*_update_batch_sql(batch_id, patch))
+
+
+def _like_pattern(value: str, prefix_only: bool = False) -> str:
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{escaped}%" if prefix_only else f"%{escaped}%"
 
 
-def list_batches(filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+def _keyword_rank(snapshot: str, name: str, keyword: str) -> Tuple[str, List[Any]]:
+    rank = (
+        f"CASE WHEN {snapshot} = ? OR {name} = ? THEN 0 "
+        f"WHEN {snapshot} LIKE ? ESCAPE '\\' OR {name} LIKE ? ESCAPE '\\' THEN 1 "
+        "ELSE 2 END"
+    )
+    prefix = _like_pattern(keyword, prefix_only=True)
+    return rank, [keyword, keyword, prefix, prefix]
+
+
+def _keyword_search(keyword: str) -> Tuple[str, List[Any], str, List[Any]]:
+    """WHERE and ORDER BY fragments for a keyword over inventory_search.
+
+    The trigram index answers MATCH for keywords of three or more characters;
+    shorter ones (a single "鸡") fall back to LIKE, which SQLite evaluates over
+    the compact search table rather than the batch rows. Matches rank exact name,
+    then prefix, then substring.
+    """
+    if len(keyword) >= 3:
+        where = "inventory_search MATCH ?"
+        where_values: List[Any] = ['"' + keyword.replace('"', '""') + '"']
+    else:
+        where = "(inventory_search.item_name_snapshot LIKE ? ESCAPE '\\' OR inventory_search.item_name LIKE ? ESCAPE '\\')"
+        where_values = [_like_pattern(keyword)] * 2
+    rank, rank_values = _keyword_rank("inventory_search.item_name_snapshot", "inventory_search.item_name", keyword)
+    return where, where_values, rank, rank_values
+
+
+def _archive_keyword_search(keyword: str) -> Tuple[str, List[Any], str, List[Any]]:
+    """Same contract as _keyword_search for the archive, which has no search index and falls back to LIKE.
+
+    Expects ``inventory_batches_archive b LEFT JOIN items i``.
+    """
+    where = "(b.item_name_snapshot LIKE ? ESCAPE '\\' OR i.name LIKE ? ESCAPE '\\')"
+    rank, rank_values = _keyword_rank("b.item_name_snapshot", "i.name", keyword)
+    return where, [_like_pattern(keyword)] * 2, rank, rank_values
+
+
+FINISHED_STATUSES = ("consumed", "discarded")
+# Consumed/discarded batches untouched for this many days move to inventory_batches_archive
+# (never sooner than EVENT_RETENTION_DAYS, see archive_grace_days).
+BATCH_ARCHIVE_DAYS = int(os.getenv("SMART_FRIDGE_BATCH_ARCHIVE_DAYS", "30"))
+
+
+def _includes_archive(filters: Dict[str, Any]) -> bool:
+    return filters.get("status") in FINISHED_STATUSES
+
+
+def _batch_filter_conditions(filters: Dict[str, Any], alias: str = "b.") -> Tuple[List[str], List[Any]]:
     conditions = ["1=1"]
     values: List[Any] = []
     if filters.get("location"):
-        conditions.append("location = ?")
+        conditions.append(f"{alias}location = ?")
         values.append(filters["location"])
     if filters.get("status"):
-        conditions.append("status = ?")
+        conditions.append(f"{alias}status = ?")
         values.append(filters["status"])
-    if filters.get("keyword"):
-        conditions.append("item_name_snapshot LIKE ?")
-        values.append(f"%{filters['keyword']}%")
+    return conditions, values
+
+
+BATCH_COLUMNS = (
+    "batch_id",
+    "item_id",
+    "item_name_snapshot",
+    "quantity",
+    "unit",
+    "purchase_date",
+    "expire_date",
+    "location",
+    "status",
+    "source_type",
+    "source_ref_id",
+    "created_at",
+    "updated_at",
+)
+# Readable but not writable: generated from expire_date (migration 0011), present on the archive too.
+BATCH_READ_COLUMNS = BATCH_COLUMNS + ("expire_day",)
+
+
+def _batches_query(
+    filters: Dict[str, Any], limit: Optional[int], columns: Iterable[str] = BATCH_READ_COLUMNS
+) -> Tuple[str, List[Any]]:
+    """Filtered batches in expiry order; finished-status filters also read inventory_batches_archive."""
+    columns = list(columns)
+    select = ", ".join(f"b.{col}" for col in columns)
+    conditions, values = _batch_filter_conditions(filters)
+    keyword = (filters.get("keyword") or "").strip()
+    if not _includes_archive(filters):
+        source = "inventory_batches b"
+        order = "b.expire_date IS NULL, b.expire_date"
+        if keyword:
+            where, where_values, rank, rank_values = _keyword_search(keyword)
+            source = "inventory_search JOIN inventory_batches b ON b.batch_id = inventory_search.batch_id"
+            conditions.append(where)
+            values.extend(where_values)
+            order = f"{rank}, {order}"
+            values.extend(rank_values)
+        query = f"SELECT {select} FROM {source} WHERE {' AND '.join(conditions)} ORDER BY {order} LIMIT ?"
+        return query, values + [-1 if limit is None else limit]
+
+    tiers = [
+        ("inventory_batches b", "inventory_search JOIN inventory_batches b ON b.batch_id = inventory_search.batch_id", _keyword_search),
+        ("inventory_batches_archive b", "inventory_batches_archive b LEFT JOIN items i ON i.item_id = b.item_id", _archive_keyword_search),
+    ]
+    parts: List[str] = []
+    params: List[Any] = []
+    for plain_source, keyword_source, search in tiers:
+        tier_conditions, tier_values = list(conditions), list(values)
+        source, rank, rank_values = plain_source, "0", []
+        if keyword:
+            where, where_values, rank, rank_values = search(keyword)
+            source = keyword_source
+            tier_conditions.append(where)
+            tier_values.extend(where_values)
+        parts.append(f"SELECT {select}, {rank} AS search_rank FROM {source} WHERE {' AND '.join(tier_conditions)}")
+        params.extend(rank_values + tier_values)
     query = (
-        "SELECT * FROM inventory_batches "
-        f"WHERE {' AND '.join(conditions)} ORDER BY expire_date IS NULL, expire_date"
+        f"SELECT {', '.join(columns)} FROM ({' UNION ALL '.join(parts)}) "
+        "ORDER BY search_rank, expire_date IS NULL, expire_date LIMIT ?"
     )
-    return fetch_all(query, values)
+    return query, params + [-1 if limit is None else limit]
 
 
-def get_batch(batch_id: str) -> Optional[Dict[str, Any]]:
-    return fetch_one("SELECT * FROM inventory_batches WHERE batch_id = ?", (batch_id,))
+def list_batches(filters: Dict[str, Any], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    return cached_fetch_all(*_batches_query(filters, limit))
 
 
-def insert_event(event: Dict[str, Any]) -> None:
-    execute(
-        "INSERT INTO inventory_events(event_id, batch_id, event_type, delta_quantity, note, actor, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
-        (
-            event["event_id"],
-            event["batch_id"],
-            event["event_type"],
-            event.get("delta_quantity"),
-            event.get("note"),
-            event.get("actor"),
-            event["created_at"],
-        ),
+def iter_batches(filters: Dict[str, Any], limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    return iter_rows(*_batches_query(filters, limit))
+
+
+def iter_batch_records(filters: Dict[str, Any], limit: Optional[int] = None) -> Iterator[Any]:
+    return iter_records(InventoryBatchRecord, *_batches_query(filters, limit, columns=InventoryBatchRecord._fields))
+
+
+def _batch_projection(columns: Optional[Iterable[str]]) -> str:
+    if not columns:
+        return ", ".join(BATCH_READ_COLUMNS)
+    selected = list(dict.fromkeys(columns))
+    unknown = [col for col in selected if col not in BATCH_READ_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown inventory_batches columns: {', '.join(unknown)}")
+    # The cursor is built from these, so they are always returned.
+    for required in ("expire_date", "batch_id"):
+        if required not in selected:
+            selected.append(required)
+    return ", ".join(selected)
+
+
+def _page_region(
+    tiers: List[Tuple[str, List[str], List[Any]]],
+    projection: str,
+    extra: List[str],
+    extra_values: List[Any],
+    order: str,
+    limit: int,
+) -> List[Dict[str, Any]]:
+    """One keyset range read per tier, merged in ``order`` when the archive is included."""
+    parts: List[str] = []
+    params: List[Any] = []
+    for table, conditions, values in tiers:
+        parts.append(
+            f"SELECT {projection} FROM {table} WHERE {' AND '.join(conditions + extra)} ORDER BY {order} LIMIT ?"
+        )
+        params.extend(values + extra_values + [limit])
+    if len(parts) == 1:
+        return cached_fetch_all(parts[0], params)
+    merged = " UNION ALL ".join(f"SELECT * FROM ({part})" for part in parts)
+    return cached_fetch_all(f"{merged} ORDER BY {order} LIMIT ?", params + [limit])
+
+
+def _check_page_size(limit: int) -> None:
+    if limit < 1:
+        raise ValueError(f"page size must be at least 1, got {limit}")
+
+
+def list_batches_page(
+    filters: Dict[str, Any],
+    after: Optional[Tuple[Optional[str], str]] = None,
+    limit: int = 50,
+    columns: Optional[Iterable[str]] = None,
+) -> Dict[str, Any]:
+    """One page of batches in expiry order (undated last), keyed by ``(expire_date, batch_id)``.
+
+    Pass the returned ``next`` cursor as ``after`` to fetch the following page.
+    Dated and undated batches are read as two index ranges, so each page costs
+    O(log n + limit) no matter how deep it is. Keywords filter through
+    inventory_search but do not change the order. Finished-status filters also
+    page through inventory_batches_archive.
+    """
+    _check_page_size(limit)
+    projection = _batch_projection(columns)
+    conditions, values = _batch_filter_conditions(filters, alias="")
+    keyword = (filters.get("keyword") or "").strip()
+    hot_conditions, hot_values = list(conditions), list(values)
+    archive_conditions, archive_values = list(conditions), list(values)
+    if keyword:
+        where, where_values, _, _ = _keyword_search(keyword)
+        hot_conditions.append(f"batch_id IN (SELECT batch_id FROM inventory_search WHERE {where})")
+        hot_values.extend(where_values)
+        archive_conditions.append(
+            "(item_name_snapshot LIKE ? ESCAPE '\\' "
+            "OR item_id IN (SELECT item_id FROM items WHERE name LIKE ? ESCAPE '\\'))"
+        )
+        archive_values.extend([_like_pattern(keyword)] * 2)
+    tiers = [("inventory_batches", hot_conditions, hot_values)]
+    if _includes_archive(filters):
+        tiers.append(("inventory_batches_archive", archive_conditions, archive_values))
+
+    rows: List[Dict[str, Any]] = []
+    if after is None or after[0] is not None:
+        dated = ["expire_date IS NOT NULL"]
+        dated_values: List[Any] = []
+        if after is not None:
+            dated.append("(expire_date, batch_id) > (?, ?)")
+            dated_values.extend(after)
+        rows = _page_region(tiers, projection, dated, dated_values, "expire_date, batch_id", limit + 1)
+    if len(rows) <= limit:
+        undated = ["expire_date IS NULL"]
+        undated_values: List[Any] = []
+        if after is not None and after[0] is None:
+            undated.append("batch_id > ?")
+            undated_values.append(after[1])
+        rows += _page_region(tiers, projection, undated, undated_values, "batch_id", limit + 1 - len(rows))
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = (rows[-1]["expire_date"], rows[-1]["batch_id"]) if has_more else None
+    return {"batches": rows, "next": next_cursor}
+
+
+def rebuild_search_index() -> int:
+    """Repopulate inventory_search and its batch_id map from inventory_batches."""
+    with transaction() as conn:
+        conn.execute("DELETE FROM inventory_search")
+        conn.execute("DELETE FROM inventory_search_rows")
+        conn.execute("INSERT INTO inventory_search_rows(batch_id) SELECT batch_id FROM inventory_batches")
+        cur = conn.execute(
+            """
+            INSERT INTO inventory_search(rowid, batch_id, item_name_snapshot, item_name)
+            SELECT r.search_rowid, b.batch_id, b.item_name_snapshot, COALESCE(i.name, '')
+            FROM inventory_search_rows r
+            JOIN inventory_batches b ON b.batch_id = r.batch_id
+            LEFT JOIN items i ON i.item_id = b.item_id
+            """
+        )
+        return cur.rowcount
+
+
+def get_batch(batch_id: str, include_archived: bool = False) -> Optional[Dict[str, Any]]:
+    row = fetch_one("SELECT * FROM inventory_batches WHERE batch_id = ?", (batch_id,))
+    if row is None and include_archived:
+        row = fetch_one(
+            f"SELECT {', '.join(BATCH_READ_COLUMNS)}, archived_at FROM inventory_batches_archive WHERE batch_id = ?",
+            (batch_id,),
+        )
+    return row
+
+
+def get_batches(batch_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """Hot batches for ``batch_ids`` in one query, keyed by batch_id (unknown ids are absent)."""
+    rows = fetch_all(
+        "SELECT * FROM inventory_batches WHERE batch_id IN (SELECT value FROM json_each(?))",
+        (json.dumps(list(batch_ids)),),
     )
+    return {row["batch_id"]: row for row in rows}
+
+
+EVENT_COLUMNS = "event_id, batch_id, event_type, delta_quantity, note, actor, created_at"
+EVENT_INSERT_SQL = f"INSERT INTO inventory_events({EVENT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)"
+
+
+def _event_params(event: Dict[str, Any]) -> Tuple[Any, ...]:
+    return (
+        event["event_id"],
+        event["batch_id"],
+        event["event_type"],
+        event.get("delta_quantity"),
+        event.get("note"),
+        event.get("actor"),
+        event["created_at"],
+    )
+
+
+def insert_event(event: Dict[str, Any]) -> None:
+    execute(EVENT_INSERT_SQL, _event_params(event))
+
+
+class UnitOfWork:
+    """Batch and event writes queued by one API call, flushed as one transaction.
+
+    Nothing touches the database until the ``unit_of_work()`` block exits
+    cleanly; new batches and events are then written with one ``executemany``
+    each and committed together, or rolled back together on any error.
+    """
+
+    def __init__(self) -> None:
+        self.batches: List[Dict[str, Any]] = []
+        self.updates: List[Tuple[str, List[Any]]] = []
+        self.events: List[Dict[str, Any]] = []
+
+    def add_batch(self, batch: Dict[str, Any]) -> None:
+        self.batches.append(batch)
+
+    def update_batch(self, batch_id: str, patch: Dict[str, Any]) -> None:
+        self.updates.append(_update_batch_sql(batch_id, patch))
+
+    def deplete_batch(self, batch_id: str, delta_quantity: float, empty_status: str) -> None:
+        """Subtract ``delta_quantity`` in SQL, flipping status once nothing is left."""
+        self.updates.append(
+            (
+                """
+                UPDATE inventory_batches
+                SET quantity = MAX(0, quantity - ?),
+                    status = CASE WHEN quantity - ? <= 0 THEN ? ELSE status END,
+                    updated_at = ?
+                WHERE batch_id = ?
+                """,
+                [delta_quantity, delta_quantity, empty_status, now_ts(), batch_id],
+            )
+        )
+
+    def add_event(self, event: Dict[str, Any]) -> None:
+        self.events.append(event)
+
+    def flush(self, conn: sqlite3.Connection) -> None:
+        if self.batches:
+            conn.executemany(BATCH_INSERT_SQL, [_batch_params(batch) for batch in self.batches])
+        for query, values in self.updates:
+            conn.execute(query, values)
+        if self.events:
+            conn.executemany(EVENT_INSERT_SQL, [_event_params(event) for event in self.events])
+
+
+@contextmanager
+def unit_of_work() -> Iterator[UnitOfWork]:
+    uow = UnitOfWork()
+    yield uow
+    _write(uow.flush, ("inventory_batches", "inventory_events"))
 
 
 def list_events(limit: int = 10) -> List[Dict[str, Any]]:
@@ -207,20 +1447,155 @@ def list_events(limit: int = 10) -> List[Dict[str, Any]]:
     )
 
 
+def list_events_page(before: Optional[Tuple[str, str]] = None, limit: int = 20) -> Dict[str, Any]:
+    """Newest-first events keyed by ``(created_at, event_id)``; pass ``next`` back as ``before``."""
+    _check_page_size(limit)
+    condition = "1=1"
+    values: List[Any] = []
+    if before is not None:
+        condition = "(created_at, event_id) < (?, ?)"
+        values.extend(before)
+    rows = fetch_all(
+        f"SELECT * FROM inventory_events WHERE {condition} ORDER BY created_at DESC, event_id DESC LIMIT ?",
+        values + [limit + 1],
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = (rows[-1]["created_at"], rows[-1]["event_id"]) if has_more else None
+    return {"events": rows, "next": next_cursor}
+
+
 def list_batch_events(batch_id: str) -> List[Dict[str, Any]]:
+    """Events for one batch across the hot table and inventory_events_archive, newest first."""
+    return fetch_all(
+        f"""
+        SELECT {EVENT_COLUMNS} FROM inventory_events WHERE batch_id = ?
+        UNION ALL
+        SELECT {EVENT_COLUMNS} FROM inventory_events_archive WHERE batch_id = ?
+        ORDER BY created_at DESC
+        """,
+        (batch_id, batch_id),
+    )
+
+
+def _archive_events(conn: sqlite3.Connection, condition: str, params: Iterable[Any]) -> int:
+    """Fold hot events matching ``condition`` (alias ``e``) into inventory_event_daily and move them to the archive.
+
+    Events whose event_id is already archived (re-imported, or restored from an
+    older backup) are only dropped from the hot table: they were counted when
+    first archived.
+    """
+    params = tuple(params)
+    fresh = f"({condition}) AND NOT EXISTS (SELECT 1 FROM inventory_events_archive a WHERE a.event_id = e.event_id)"
+    conn.execute(
+        f"""
+        INSERT INTO inventory_event_daily(item_id, event_type, day, sum_delta, event_count)
+        SELECT COALESCE(b.item_id, 0), e.event_type, substr(e.created_at, 1, 10),
+               COALESCE(SUM(e.delta_quantity), 0), COUNT(*)
+        FROM inventory_events e LEFT JOIN inventory_batches b ON b.batch_id = e.batch_id
+        WHERE {fresh}
+        GROUP BY 1, 2, 3
+        ON CONFLICT(day, item_id, event_type) DO UPDATE SET
+          sum_delta = sum_delta + excluded.sum_delta,
+          event_count = event_count + excluded.event_count
+        """,
+        params,
+    )
+    conn.execute(
+        f"INSERT INTO inventory_events_archive({EVENT_COLUMNS}) SELECT {EVENT_COLUMNS} FROM inventory_events e WHERE {fresh}",
+        params,
+    )
+    return conn.execute(f"DELETE FROM inventory_events AS e WHERE {condition}", params).rowcount
+
+
+def _event_horizon(retention_days: Optional[int]) -> Tuple[str, int]:
+    """(cutoff date, created_epoch bound) for events older than the retention window.
+
+    Counted in UTC days, like created_at/created_epoch: a local date would move
+    the bound by the UTC offset.
+    """
+    days = EVENT_RETENTION_DAYS if retention_days is None else retention_days
+    cutoff_day = add_days(utc_today(), -days)
+    return format_date(cutoff_day), day_number(cutoff_day) * 86400
+
+
+def rollup_events(retention_days: Optional[int] = None) -> Dict[str, Any]:
+    """Roll up and archive events created before ``retention_days`` ago (default EVENT_RETENTION_DAYS)."""
+    cutoff, horizon = _event_horizon(retention_days)
+    with transaction() as conn:
+        archived = _archive_events(conn, "e.created_epoch < ?", (horizon,))
+    return {"cutoff": cutoff, "archived": archived}
+
+
+def archive_grace_days(grace_days: Optional[int] = None) -> int:
+    """The grace period archive_finished_batches actually applies.
+
+    ``grace_days`` (default BATCH_ARCHIVE_DAYS) is clamped up to EVENT_RETENTION_DAYS:
+    a batch's events move with it, and events younger than that stay in inventory_events.
+    """
+    days = BATCH_ARCHIVE_DAYS if grace_days is None else grace_days
+    return max(days, EVENT_RETENTION_DAYS)
+
+
+def archive_finished_batches(grace_days: Optional[int] = None) -> Dict[str, Any]:
+    """Move consumed/discarded batches not updated for archive_grace_days(grace_days) days to the archive.
+
+    Their events go first (rolled up and archived), since inventory_events references the batch.
+    Batches with events still inside the EVENT_RETENTION_DAYS window wait, so
+    recent history stays in inventory_events until rollup_events is due to move it.
+    The cutoff is a UTC timestamp, like updated_at; the result reports it with the grace period used.
+    In-stock counters and totals are untouched: the delete triggers only react to in-stock rows.
+    """
+    days = archive_grace_days(grace_days)
+    cutoff = ts_days_ago(days)
+    _, horizon = _event_horizon(None)
+    finished = (
+        f"status IN ({', '.join('?' for _ in FINISHED_STATUSES)}) AND updated_at < ? "
+        "AND NOT EXISTS (SELECT 1 FROM inventory_events r WHERE r.batch_id = inventory_batches.batch_id "
+        "AND r.created_epoch >= ?)"
+    )
+    params = (*FINISHED_STATUSES, cutoff, horizon)
+    with transaction() as conn:
+        events = _archive_events(
+            conn, f"e.batch_id IN (SELECT batch_id FROM inventory_batches WHERE {finished})", params
+        )
+        conn.execute(
+            f"INSERT INTO inventory_batches_archive({', '.join(BATCH_COLUMNS)}, archived_at) "
+            f"SELECT {', '.join(BATCH_COLUMNS)}, ? FROM inventory_batches WHERE {finished}",
+            (now_ts(), *params),
+        )
+        batches = conn.execute(f"DELETE FROM inventory_batches WHERE {finished}", params).rowcount
+    return {"cutoff": cutoff, "grace_days": days, "batches": batches, "events": events}
+
+
+def list_event_daily(since: Optional[str] = None, item_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Daily event totals from the rollup table, oldest day first; only covers archived events."""
+    conditions = ["day >= ?"]
+    values: List[Any] = [since or ""]
+    if item_id is not None:
+        conditions.append("item_id = ?")
+        values.append(item_id)
     return fetch_all(
-        "SELECT * FROM inventory_events WHERE batch_id = ? ORDER BY created_at DESC",
-        (batch_id,),
+        f"SELECT * FROM inventory_event_daily WHERE {' AND '.join(conditions)} ORDER BY day, item_id, event_type",
+        values,
     )
 
 
-def list_expiring(days: int) -> List[Dict[str, Any]]:
+def list_expiring(days: int, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """In-stock batches expiring within ``days`` (overdue included), soonest first.
+
+    Served by idx_inventory_batches_status_expire_day; ``days_left`` is integer arithmetic in SQL.
+    """
+    current = day_number(today())
     return fetch_all(
         """
-        SELECT * FROM inventory_batches
-        WHERE status = 'in_stock' AND expire_date IS NOT NULL
-        ORDER BY expire_date
-        """
+        SELECT *, expire_day - ? AS days_left
+        FROM inventory_batches
+        WHERE status = 'in_stock' AND expire_day <= ?
+        ORDER BY expire_day
+        LIMIT ?
+        """,
+        (current, current + days, -1 if limit is None else limit),
     )
 
 
@@ -233,7 +1608,8 @@ def insert_menu_plan(menu_id: str, days: int, servings: int, constraints: Dict[s
 
 def insert_menu_plan_items(items: List[Dict[str, Any]]) -> None:
     execute_many(
-        "INSERT INTO menu_plan_items(id, menu_id, date, meal_type, recipe_id, explain_json, nutrition_json) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        "INSERT INTO menu_plan_items(id, menu_id, date, meal_type, recipe_id, explain_json, nutrition_json, calories) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
         [
             (
                 item["id"],
@@ -243,12 +1619,20 @@ def insert_menu_plan_items(items: List[Dict[str, Any]]) -> None:
                 item["recipe_id"],
                 to_json(item.get("explain") or []),
                 to_json(item.get("nutrition") or {}),
+                _calories(item.get("nutrition")),
             )
             for item in items
         ],
     )
 
 
+def _calories(nutrition: Optional[Dict[str, Any]]) -> Optional[float]:
+    try:
+        return float((nutrition or {})["calories"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
 def insert_shopping_items(items: List[Dict[str, Any]]) -> None:
     execute_many(
         "INSERT INTO shopping_list_items(id, menu_id, item_id, item_name_snapshot, need_qty, unit, reason_json, checked) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
@@ -268,6 +1652,14 @@ def insert_shopping_items(items: List[Dict[str, Any]]) -> None:
     )
 
 
+def list_menu_ids(limit: Optional[int] = None) -> List[str]:
+    rows = cached_fetch_all(
+        "SELECT menu_id FROM menu_plans ORDER BY generated_at DESC LIMIT ?",
+        (-1 if limit is None else limit,),
+    )
+    return [row["menu_id"] for row in rows]
+
+
 def get_menu(menu_id: str) -> Optional[Dict[str, Any]]:
     plan = fetch_one("SELECT * FROM menu_plans WHERE menu_id = ?", (menu_id,))
     if not plan:
@@ -284,6 +1676,22 @@ def get_menu(menu_id: str) -> Optional[Dict[str, Any]]:
     return plan
 
 
+def menu_calorie_totals(menu_id: str) -> Dict[str, Any]:
+    """Per-day and whole-plan calories summed in SQL from menu_plan_items.calories."""
+    days = fetch_all(
+        """
+        SELECT date, SUM(calories) AS calories, COUNT(calories) AS meals_with_calories, COUNT(*) AS meals
+        FROM menu_plan_items
+        WHERE menu_id = ?
+        GROUP BY date
+        ORDER BY date
+        """,
+        (menu_id,),
+    )
+    total = sum(day["calories"] or 0 for day in days)
+    return {"days": days, "total": total}
+
+
 def list_shopping_items(menu_id: str) -> List[Dict[str, Any]]:
     items = fetch_all(
         "SELECT * FROM shopping_list_items WHERE menu_id = ? ORDER BY checked, item_name_snapshot",
@@ -300,6 +1708,110 @@ def update_shopping_item_checked(item_id: str, checked: bool) -> Optional[Dict[s
     return fetch_one("SELECT * FROM shopping_list_items WHERE id = ?", (item_id,))
 
 
+def set_shopping_items_checked(menu_id: str, item_ids: Optional[Iterable[str]], checked: bool) -> int:
+    """Set ``checked`` on the given shopping items of one menu (all of them when ``item_ids`` is None).
+
+    One UPDATE in one transaction; returns how many rows actually changed.
+    """
+    flag = 1 if checked else 0
+    query = "UPDATE shopping_list_items SET checked = ? WHERE menu_id = ? AND checked IS NOT ?"
+    params: List[Any] = [flag, menu_id, flag]
+    if item_ids is not None:
+        query += " AND id IN (SELECT value FROM json_each(?))"
+        params.append(json.dumps(list(item_ids)))
+    return _write(lambda conn: conn.execute(query, params).rowcount, ("shopping_list_items",))
+
+
+def set_shopping_items_checked_state(menu_id: str, checked_ids: Iterable[str]) -> int:
+    """Make ``checked_ids`` exactly the checked items of one menu; every other item is unchecked.
+
+    One UPDATE in one transaction; returns how many rows actually changed.
+    """
+    checked = "(id IN (SELECT value FROM json_each(?)))"
+    query = f"UPDATE shopping_list_items SET checked = {checked} WHERE menu_id = ? AND checked IS NOT {checked}"
+    ids = json.dumps(list(checked_ids))
+    return _write(lambda conn: conn.execute(query, (ids, menu_id, ids)).rowcount, ("shopping_list_items",))
+
+
 def count_rows(table: str) -> int:
     row = fetch_one(f"SELECT COUNT(*) as count FROM {table}")
     return int(row["count"]) if row else 0
+
+
+_INVENTORY_TOTALS_SQL = """
+SELECT item_id, unit, SUM(quantity), MIN(expire_date), COUNT(*) FROM inventory_batches
+WHERE status = 'in_stock' AND item_id IS NOT NULL
+GROUP BY item_id, unit
+"""
+
+
+def list_inventory_totals() -> List[Dict[str, Any]]:
+    """Trigger-maintained in-stock totals per (item_id, unit), with the item name."""
+    return fetch_all(
+        """
+        SELECT t.item_id, i.name AS item_name, t.unit, t.total_qty, t.earliest_expire_date, t.batch_count
+        FROM inventory_totals t LEFT JOIN items i ON i.item_id = t.item_id
+        ORDER BY t.item_id, t.unit
+        """
+    )
+
+
+def rebuild_inventory_totals() -> int:
+    """Recompute inventory_totals from inventory_batches (repair after manual edits)."""
+    with transaction() as conn:
+        conn.execute("DELETE FROM inventory_totals")
+        cur = conn.execute(
+            "INSERT INTO inventory_totals(item_id, unit, total_qty, earliest_expire_date, batch_count) "
+            + _INVENTORY_TOTALS_SQL
+        )
+        return cur.rowcount
+
+
+_KPI_EXPECTED_SQL = {
+    "in_stock_batches": "SELECT COUNT(*) FROM inventory_batches WHERE status = 'in_stock'",
+    "in_stock_no_expiry": "SELECT COUNT(*) FROM inventory_batches WHERE status = 'in_stock' AND expire_date IS NULL",
+    "recipes": "SELECT COUNT(*) FROM recipes",
+}
+_EXPIRY_BUCKETS_SQL = """
+SELECT expire_date, COUNT(*) AS batch_count FROM inventory_batches
+WHERE status = 'in_stock' AND expire_date IS NOT NULL
+GROUP BY expire_date
+"""
+
+
+def get_kpi_counters(expiring_days: int = 3) -> Dict[str, int]:
+    """Trigger-maintained counters plus in-stock batches expiring within ``expiring_days`` / already expired.
+
+    Read through the query cache: the inventory page asks for them on every rerun.
+    """
+    counters = {row["name"]: int(row["value"]) for row in cached_fetch_all("SELECT name, value FROM kpi_counters")}
+    bucket_sum = "SELECT COALESCE(SUM(batch_count), 0) AS count FROM inventory_expiry_buckets WHERE expire_date {} ?"
+    current = today()
+    rows = cached_fetch_all(bucket_sum.format("<="), (format_date(add_days(current, expiring_days)),))
+    counters["expiring"] = int(rows[0]["count"])
+    rows = cached_fetch_all(bucket_sum.format("<"), (format_date(current),))
+    counters["expired"] = int(rows[0]["count"])
+    return counters
+
+
+def check_kpi_counters(repair: bool = True) -> Dict[str, Any]:
+    """Recount KPI counters from the base tables and rebuild them if they drifted."""
+    with transaction() as conn:
+        mismatches = []
+        stored = {row["name"]: row["value"] for row in conn.execute("SELECT name, value FROM kpi_counters")}
+        for name, query in _KPI_EXPECTED_SQL.items():
+            expected = conn.execute(query).fetchone()[0]
+            if stored.get(name) != expected:
+                mismatches.append({"counter": name, "stored": stored.get(name), "expected": expected})
+        expected_buckets = {row[0]: row[1] for row in conn.execute(_EXPIRY_BUCKETS_SQL)}
+        stored_buckets = {
+            row[0]: row[1] for row in conn.execute("SELECT expire_date, batch_count FROM inventory_expiry_buckets")
+        }
+        if expected_buckets != stored_buckets:
+            mismatches.append({"counter": "inventory_expiry_buckets", "stored": len(stored_buckets), "expected": len(expected_buckets)})
+        if mismatches and repair:
+            for name, query in _KPI_EXPECTED_SQL.items():
+                conn.execute(f"INSERT OR REPLACE INTO kpi_counters(name, value) SELECT ?, ({query})", (name,))
+            conn.execute("DELETE FROM inventory_expiry_buckets")
+            conn.execute(f"INSERT INTO inventory_expiry_buckets(expire_date, batch_count) {_EXPIRY_BUCKETS_SQL}")
+    return {"ok": not mismatches, "mismatches": mismatches, "repaired": bool(mismatches and repair)}
@@ -1,69 +1,70 @@
 from __future__ import annotations
 
-import uuid
-from datetime import date, timedelta
-from typing import Any, Dict, List, Tuple
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Tuple
 
 from . import db
-from .utils import format_date, from_json, now_ts, sum_by_key, today
+from .schemas import RecipeIngredientRecord
+from .utils import format_date, from_json, new_id, now_ts, sum_by_key, today
 
 
-def _inventory_map(batches: List[Dict[str, Any]]) -> Dict[int, float]:
+def _inventory_map(totals: Iterable[Dict[str, Any]]) -> Dict[int, float]:
     inv: Dict[int, float] = {}
-    for batch in batches:
-        if not batch.get("item_id"):
-            continue
-        inv[batch["item_id"]] = inv.get(batch["item_id"], 0) + float(batch["quantity"])
+    for row in totals:
+        inv[row["item_id"]] = inv.get(row["item_id"], 0) + float(row["total_qty"])
     return inv
 
 
-def _expiring_bonus(recipe_items: List[Dict[str, Any]], batches: List[Dict[str, Any]]) -> float:
+def _expiring_days(batches: Iterable[Dict[str, Any]]) -> Dict[int, List[int]]:
+    expiring: Dict[int, List[int]] = {}
+    for batch in batches:
+        if batch.get("item_id"):
+            expiring.setdefault(batch["item_id"], []).append(batch["days_left"])
+    return expiring
+
+
+def _expiring_bonus(recipe_items: List[RecipeIngredientRecord], expiring: Dict[int, List[int]]) -> float:
     bonus = 0.0
     for ing in recipe_items:
-        for batch in batches:
-            if batch.get("item_id") == ing["item_id"] and batch.get("expire_date"):
-                days_left = (date.fromisoformat(batch["expire_date"]) - today()).days
-                if days_left <= 3:
-                    bonus += max(0, 3 - days_left)
+        for days_left in expiring.get(ing.item_id, []):
+            bonus += max(0, 3 - days_left)
     return bonus
 
 
-def _coverage(recipe_items: List[Dict[str, Any]], inventory: Dict[int, float]) -> Tuple[float, Dict[int, float]]:
+def _coverage(recipe_items: List[RecipeIngredientRecord], inventory: Dict[int, float]) -> Tuple[float, Dict[int, float]]:
     if not recipe_items:
         return 0.0, {}
     covered = 0
     gaps: Dict[int, float] = {}
     for ing in recipe_items:
-        need = float(ing["quantity"])
-        have = inventory.get(ing["item_id"], 0)
+        need = float(ing.quantity)
+        have = inventory.get(ing.item_id, 0)
         if have >= need:
             covered += 1
         else:
-            gaps[ing["item_id"]] = need - have
+            gaps[ing.item_id] = need - have
     coverage = covered / len(recipe_items)
     return coverage, gaps
 
 
 def generate_menu(days: int, servings: int, constraints: Dict[str, Any]) -> Dict[str, Any]:
-    recipes = db.list_recipes()
-    recipe_ings = db.list_recipe_ingredients()
-    batches = db.list_batches({"status": "in_stock"})
-    inventory = _inventory_map(batches)
+    inventory = _inventory_map(db.list_inventory_totals())
+    expiring = _expiring_days(db.list_expiring(3))
     allergens_exclude = set(constraints.get("allergens_exclude") or [])
     prefer_expiring = bool(constraints.get("prefer_expiring", True))
 
-    recipe_map: Dict[int, List[Dict[str, Any]]] = {}
-    for ing in recipe_ings:
-        recipe_map.setdefault(ing["recipe_id"], []).append(ing)
+    recipe_map: Dict[int, List[RecipeIngredientRecord]] = {}
+    for ing in db.iter_recipe_ingredient_records():
+        recipe_map.setdefault(ing.recipe_id, []).append(ing)
 
-    scored: List[Tuple[int, float, Dict[int, float], List[str]]] = []
-    for recipe in recipes:
-        allergens = set(filter(None, (recipe.get("allergens") or "").split(",")))
+    scored: List[Tuple[int, float, Dict[int, float], List[str], str]] = []
+    for recipe in db.iter_recipe_records():
+        allergens = set(filter(None, (recipe.allergens or "").split(",")))
         if allergens_exclude and allergens_exclude.intersection(allergens):
             continue
-        recipe_items = recipe_map.get(recipe["recipe_id"], [])
+        recipe_items = recipe_map.get(recipe.recipe_id, [])
         coverage, gaps = _coverage(recipe_items, inventory)
-        bonus = _expiring_bonus(recipe_items, batches) if prefer_expiring else 0.0
+        bonus = _expiring_bonus(recipe_items, expiring) if prefer_expiring else 0.0
         score = coverage + bonus * 0.2 - sum_by_key(
             [
                 {"gap": gap}
@@ -75,11 +76,11 @@ def generate_menu(days: int, servings: int, constraints: Dict[str, Any]) -> Dict
             f"覆盖率 {coverage:.0%}，缺口较小" if gaps else "库存覆盖率高",
             "包含临期批次，加速消耗" if bonus > 0 else "使用常备食材",
         ]
-        scored.append((recipe["recipe_id"], score, gaps, explain))
+        scored.append((recipe.recipe_id, score, gaps, explain, recipe.nutrition_json or "{}"))
 
     scored.sort(key=lambda x: x[1], reverse=True)
 
-    menu_id = f"menu_{uuid.uuid4().hex[:8]}"
+    menu_id = new_id("menu")
     db.insert_menu_plan(menu_id, days, servings, constraints)
 
     plan_items = []
@@ -94,22 +95,19 @@ def generate_menu(days: int, servings: int, constraints: Dict[str, Any]) -> Dict
             idx += 1
         if idx >= len(scored):
             break
-        recipe_id, _, gaps, explain = scored[idx]
+        recipe_id, _, gaps, explain, nutrition_json = scored[idx]
         used_recipes.add(recipe_id)
         date_str = format_date(day_cursor)
         meal_type = meal_types[len(plan_items) % len(meal_types)]
         plan_items.append(
             {
-                "id": f"mpi_{uuid.uuid4().hex[:8]}",
+                "id": new_id("mpi"),
                 "menu_id": menu_id,
                 "date": date_str,
                 "meal_type": meal_type,
                 "recipe_id": recipe_id,
                 "explain": explain,
-                "nutrition": from_json(
-                    next((r["nutrition_json"] for r in recipes if r["recipe_id"] == recipe_id), "{}"),
-                    {},
-                ),
+                "nutrition": from_json(nutrition_json, {}),
             }
         )
         for item_id, gap in gaps.items():
@@ -128,7 +126,7 @@ def generate_menu(days: int, servings: int, constraints: Dict[str, Any]) -> Dict
             continue
         shopping_items.append(
             {
-                "id": f"shop_{uuid.uuid4().hex[:8]}",
+                "id": new_id("shop"),
                 "menu_id": menu_id,
                 "item_id": item_id,
                 "item_name_snapshot": item["name"],
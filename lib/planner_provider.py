@@ -1,16 +1,17 @@
 from __future__ import annotations
 
+import heapq
 import json
 import os
-import uuid
 from datetime import timedelta
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
 
 import requests
 
 from . import db
+from .schemas import HttpRequest, RecipeIngredientRecord, RecipeRecord
 from .menu_engine import generate_menu as greedy_generate_menu
-from .utils import format_date, from_json, now_ts, sum_by_key, today
+from .utils import format_date, from_json, new_id, now_ts, sum_by_key, today
 
 
 class ProviderNotAvailable(Exception):
@@ -20,27 +21,25 @@ class ProviderNotAvailable(Exception):
         self.reason = reason
 
 
-def _inventory_map(batches: List[Dict[str, Any]]) -> Dict[int, float]:
+def _inventory_map(inventory: Iterable[Dict[str, Any]]) -> Dict[int, float]:
     inv: Dict[int, float] = {}
-    for batch in batches:
-        if not batch.get("item_id"):
-            continue
-        inv[batch["item_id"]] = inv.get(batch["item_id"], 0) + float(batch["quantity"])
+    for row in inventory:
+        inv[row["item_id"]] = inv.get(row["item_id"], 0) + float(row["quantity"])
     return inv
 
 
-def _coverage(recipe_items: List[Dict[str, Any]], inventory: Dict[int, float]) -> Tuple[float, Dict[int, float]]:
+def _coverage(recipe_items: List[RecipeIngredientRecord], inventory: Dict[int, float]) -> Tuple[float, Dict[int, float]]:
     if not recipe_items:
         return 0.0, {}
     covered = 0
     gaps: Dict[int, float] = {}
     for ing in recipe_items:
-        need = float(ing["quantity"])
-        have = inventory.get(ing["item_id"], 0)
+        need = float(ing.quantity)
+        have = inventory.get(ing.item_id, 0)
         if have >= need:
             covered += 1
         else:
-            gaps[ing["item_id"]] = need - have
+            gaps[ing.item_id] = need - have
     coverage = covered / len(recipe_items)
     return coverage, gaps
 
@@ -84,74 +83,92 @@ class HttpPlannerProvider:
     def _build_candidates(
         self,
         inventory: Dict[int, float],
-        recipe_map: Dict[int, List[Dict[str, Any]]],
-        recipes: List[Dict[str, Any]],
+        recipe_map: Dict[int, List[RecipeIngredientRecord]],
+        recipes: Iterable[RecipeRecord],
         top_k: int,
     ) -> List[Dict[str, Any]]:
-        scored: List[Tuple[int, float]] = []
-        for recipe in recipes:
-            items = recipe_map.get(recipe["recipe_id"], [])
-            coverage, gaps = _coverage(items, inventory)
-            score = coverage - sum_by_key(
-                [{"gap": gap} for gap in gaps.values()],
-                "gap",
-            ) * 0.05
-            scored.append((recipe["recipe_id"], score))
-        scored.sort(key=lambda x: x[1], reverse=True)
-        selected = {recipe_id for recipe_id, _ in scored[:top_k]}
+        def scored() -> Iterator[Tuple[float, int, RecipeRecord]]:
+            for idx, recipe in enumerate(recipes):
+                coverage, gaps = _coverage(recipe_map.get(recipe.recipe_id, []), inventory)
+                score = coverage - sum_by_key(
+                    [{"gap": gap} for gap in gaps.values()],
+                    "gap",
+                ) * 0.05
+                yield score, idx, recipe
+
+        # nlargest keeps only top_k recipes in memory; candidates stay in recipe order.
+        selected = heapq.nlargest(top_k, scored(), key=lambda entry: entry[0])
+        selected.sort(key=lambda entry: entry[1])
         candidates = []
         items_lookup = {item["item_id"]: item for item in db.list_items()}
-        for recipe in recipes:
-            if recipe["recipe_id"] not in selected:
-                continue
+        for _, _, recipe in selected:
             ingredients = []
-            for ing in recipe_map.get(recipe["recipe_id"], []):
-                item = items_lookup.get(ing["item_id"], {})
+            for ing in recipe_map.get(recipe.recipe_id, []):
+                item = items_lookup.get(ing.item_id, {})
                 ingredients.append(
                     {
-                        "item_id": ing["item_id"],
-                        "item_name": item.get("name") or str(ing["item_id"]),
-                        "quantity": ing["quantity"],
-                        "unit": ing["unit"],
+                        "item_id": ing.item_id,
+                        "item_name": item.get("name") or str(ing.item_id),
+                        "quantity": ing.quantity,
+                        "unit": ing.unit,
                     }
                 )
             candidates.append(
                 {
-                    "recipe_id": recipe["recipe_id"],
-                    "name": recipe["name"],
-                    "allergens": recipe.get("allergens") or "",
+                    "recipe_id": recipe.recipe_id,
+                    "name": recipe.name,
+                    "allergens": recipe.allergens or "",
                     "ingredients": ingredients,
                 }
             )
         return candidates
 
-    def _build_inventory(self, batches: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _build_inventory(self, totals: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
         inventory = []
-        for batch in batches:
+        for row in totals:
             inventory.append(
                 {
-                    "item_id": batch.get("item_id"),
-                    "item_name": batch.get("item_name_snapshot"),
-                    "quantity": batch.get("quantity"),
-                    "unit": batch.get("unit"),
-                    "expire_date": batch.get("expire_date"),
+                    "item_id": row["item_id"],
+                    "item_name": row["item_name"],
+                    "quantity": row["total_qty"],
+                    "unit": row["unit"],
+                    "expire_date": row["earliest_expire_date"],
                 }
             )
         return inventory
 
+    def _prepare(
+        self, days: int, servings: int, constraints: Dict[str, Any]
+    ) -> Tuple[Dict[str, Any], Dict[int, List[RecipeIngredientRecord]], Dict[int, float]]:
+        """Planner request payload plus the recipe/inventory maps needed to post-process the answer."""
+        recipe_map: Dict[int, List[RecipeIngredientRecord]] = {}
+        for ing in db.iter_recipe_ingredient_records():
+            recipe_map.setdefault(ing.recipe_id, []).append(ing)
+        inventory = self._build_inventory(db.list_inventory_totals())
+        inventory_map = _inventory_map(inventory)
+        payload = {
+            "days": days,
+            "servings": servings,
+            "constraints": constraints,
+            "inventory": inventory,
+            "candidates": self._build_candidates(inventory_map, recipe_map, db.iter_recipe_records(), top_k=10),
+            "top_k": 10,
+        }
+        return payload, recipe_map, inventory_map
+
     def _calculate_gap(
         self,
         recipe_ids: List[int],
-        recipe_map: Dict[int, List[Dict[str, Any]]],
+        recipe_map: Dict[int, List[RecipeIngredientRecord]],
         inventory: Dict[int, float],
     ) -> Dict[int, float]:
         gap: Dict[int, float] = {}
         for recipe_id in recipe_ids:
             for ing in recipe_map.get(recipe_id, []):
-                need = float(ing["quantity"])
-                have = inventory.get(ing["item_id"], 0)
+                need = float(ing.quantity)
+                have = inventory.get(ing.item_id, 0)
                 if have < need:
-                    gap[ing["item_id"]] = gap.get(ing["item_id"], 0) + (need - have)
+                    gap[ing.item_id] = gap.get(ing.item_id, 0) + (need - have)
         return gap
 
     def _build_plan_items(
@@ -169,7 +186,7 @@ class HttpPlannerProvider:
             recipe = recipes.get(recipe_id, {})
             plan_items.append(
                 {
-                    "id": f"mpi_{uuid.uuid4().hex[:8]}",
+                    "id": new_id("mpi"),
                     "menu_id": menu_id,
                     "date": format_date(day_cursor),
                     "meal_type": meal_types[idx % len(meal_types)],
@@ -195,7 +212,7 @@ class HttpPlannerProvider:
                 continue
             shopping_items.append(
                 {
-                    "id": f"shop_{uuid.uuid4().hex[:8]}",
+                    "id": new_id("shop"),
                     "menu_id": menu_id,
                     "item_id": item_id,
                     "item_name_snapshot": item["name"],
@@ -209,44 +226,63 @@ class HttpPlannerProvider:
 
     def generate(self, days: int, servings: int, constraints: Dict[str, Any]) -> Dict[str, Any]:
         print("[DEBUG][HttpPlanner] endpoint =", repr(self.endpoint)) 
+        request, context = self.build_request(days, servings, constraints)
+        response = requests.post(request.url, headers=request.headers, json=request.payload, timeout=request.timeout)
+        print("[DEBUG][HttpPlanner] status =", response.status_code, "text_head =", response.text[:120])
+        return self.parse_response(response.status_code, response.text, context)
+
+    def build_request(self, days: int, servings: int, constraints: Dict[str, Any]) -> Tuple[HttpRequest, Dict[str, Any]]:
+        """The planner request plus the context parse_response needs to turn its answer into a menu."""
         available, reason = self.is_available()
         if not available:
             raise ProviderNotAvailable("PROVIDER_NOT_AVAILABLE", reason)
+        context = self._context(days, servings, constraints)
+        return HttpRequest(self.endpoint, context["payload"], self._headers(), self.timeout), context
 
-        recipes = db.list_recipes()
-        recipe_map: Dict[int, List[Dict[str, Any]]] = {}
-        for ing in db.list_recipe_ingredients():
-            recipe_map.setdefault(ing["recipe_id"], []).append(ing)
-        batches = db.list_batches({"status": "in_stock"})
-        inventory_map = _inventory_map(batches)
+    def parse_response(self, status_code: int, text: str, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Persist the menu chosen in the planner's response (see build_request)."""
+        if status_code >= 400:
+            raise ProviderNotAvailable("PROVIDER_RESPONSE_ERROR", f"{status_code} {text}")
+        return self._finish(context, self._selected(json.loads(text)))
 
-        payload = {
+    def _context(self, days: int, servings: int, constraints: Dict[str, Any]) -> Dict[str, Any]:
+        payload, recipe_map, inventory_map = self._prepare(days, servings, constraints)
+        return {
             "days": days,
             "servings": servings,
             "constraints": constraints,
-            "inventory": self._build_inventory(batches),
-            "candidates": self._build_candidates(inventory_map, recipe_map, recipes, top_k=10),
-            "top_k": 10,
+            "payload": payload,
+            "recipe_map": recipe_map,
+            "inventory_map": inventory_map,
         }
-        response = requests.post(
-            self.endpoint,
-            headers=self._headers(),
-            json=payload,
-            timeout=self.timeout,
+
+    def _finish(self, context: Dict[str, Any], selected: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return self._finalize(
+            context["days"],
+            context["servings"],
+            context["constraints"],
+            selected,
+            context["recipe_map"],
+            context["inventory_map"],
         )
-        print("[DEBUG][HttpPlanner] status =", response.status_code, "text_head =", response.text[:120])
 
-        if response.status_code >= 400:
-            raise ProviderNotAvailable(
-            "PROVIDER_RESPONSE_ERROR",
-            f"{response.status_code} {response.text}")
-        # response.raise_for_status()
-        data = response.json()
+    def _selected(self, data: Dict[str, Any]) -> List[Dict[str, Any]]:
         selected = data.get("selected")
         if not isinstance(selected, list) or not selected:
             raise ProviderNotAvailable("PROVIDER_RESPONSE_INVALID", "Response missing selected list")
+        return selected
 
-        recipe_lookup = {recipe["recipe_id"]: recipe for recipe in recipes}
+    def _finalize(
+        self,
+        days: int,
+        servings: int,
+        constraints: Dict[str, Any],
+        selected: List[Dict[str, Any]],
+        recipe_map: Dict[int, List[RecipeIngredientRecord]],
+        inventory_map: Dict[int, float],
+    ) -> Dict[str, Any]:
+        """Persist the planner's selection as a menu plan plus shopping list."""
+        recipe_lookup = db.get_recipes(entry.get("recipe_id") for entry in selected)
         recipe_ids: List[int] = []
         explain_map: Dict[int, List[str]] = {}
         for entry in selected:
@@ -262,7 +298,7 @@ class HttpPlannerProvider:
         if not recipe_ids:
             raise ProviderNotAvailable("PROVIDER_RESPONSE_INVALID", "No valid recipe_id in selected list")
 
-        menu_id = f"menu_{uuid.uuid4().hex[:8]}"
+        menu_id = new_id("menu")
         db.insert_menu_plan(menu_id, days, servings, constraints)
 
         plan_items = self._build_plan_items(
@@ -388,14 +424,35 @@ class LocalModelPlannerProvider(HttpPlannerProvider):
             except Exception:
                 return {}
 
-    def _call_local_model(self, prompt: str) -> Dict[str, Any]:
+    def build_request(self, days: int, servings: int, constraints: Dict[str, Any]) -> Tuple[HttpRequest, Dict[str, Any]]:
         """
         默认使用 Ollama /api/generate。
         你也可以把 endpoint 换成 llama.cpp server 的 completion endpoint（返回字段不同的话这里适配一下）。
         """
         print("[DEBUG][LocalModel] endpoint =", repr(self.endpoint), "model =", repr(self.model))
+        available, reason = self.is_available()
+        if not available:
+            raise ProviderNotAvailable("PROVIDER_NOT_AVAILABLE", reason)
 
-        payload = {
+        # ====== 这段复用 HttpPlannerProvider 的数据准备 ======
+        context = self._context(days, servings, constraints)
+        # ====== 关键替换：本地模型决策 selected ======
+        prompt = self._build_prompt(context["payload"])
+        return HttpRequest(self.endpoint, self._model_request(prompt), None, self.timeout), context
+
+    def parse_response(self, status_code: int, text: str, context: Dict[str, Any]) -> Dict[str, Any]:
+        print("[DEBUG][LocalModel] status =", status_code, "raw_head =", text[:120])
+        if status_code >= 400:
+            raise RuntimeError(f"{status_code} {text[:200]}")
+        llm_out = self._model_output(json.loads(text))
+
+        # ====== 后续：复用 HttpPlannerProvider 的落库/计划/购物清单逻辑 ======
+        result = self._finish(context, self._selected(llm_out))
+        result["llm_raw"] = llm_out  # 便于调试
+        return result
+
+    def _model_request(self, prompt: str) -> Dict[str, Any]:
+        return {
             "model": self.model,
             "prompt": prompt,
             "stream": False,
@@ -403,87 +460,17 @@ class LocalModelPlannerProvider(HttpPlannerProvider):
                 "temperature": 0.2,
             },
         }
-        resp = requests.post(self.endpoint, json=payload, timeout=self.timeout)
-        print("[DEBUG][LocalModel] status =", resp.status_code, "raw_head =", resp.text[:120])
 
-        resp.raise_for_status()
-        data = resp.json()
+    def _model_output(self, data: Dict[str, Any]) -> Dict[str, Any]:
         # Ollama generate: {"response": "..."}
         text = data.get("response", "")
         return self._extract_json(text)
 
-    def generate(self, days: int, servings: int, constraints: Dict[str, Any]) -> Dict[str, Any]:
-        available, reason = self.is_available()
-        if not available:
-            raise ProviderNotAvailable("PROVIDER_NOT_AVAILABLE", reason)
-
-        # ====== 这段复用 HttpPlannerProvider 的数据准备 ======
-        recipes = db.list_recipes()
-        recipe_map: Dict[int, List[Dict[str, Any]]] = {}
-        for ing in db.list_recipe_ingredients():
-            recipe_map.setdefault(ing["recipe_id"], []).append(ing)
-        batches = db.list_batches({"status": "in_stock"})
-        inventory_map = _inventory_map(batches)
-
-        payload = {
-            "days": days,
-            "servings": servings,
-            "constraints": constraints,
-            "inventory": self._build_inventory(batches),
-            "candidates": self._build_candidates(inventory_map, recipe_map, recipes, top_k=10),
-            "top_k": 10,
-        }
-
-        # ====== 关键替换：本地模型决策 selected ======
-        prompt = self._build_prompt(payload)
-        llm_out = self._call_local_model(prompt)
-
-        selected = llm_out.get("selected")
+    def _selected(self, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        selected = data.get("selected")
         if not isinstance(selected, list) or not selected:
             raise ProviderNotAvailable("PROVIDER_RESPONSE_INVALID", "Local model missing selected list")
-
-        # ====== 后续：完全照抄你 HttpPlannerProvider 的落库/计划/购物清单逻辑 ======
-        recipe_lookup = {recipe["recipe_id"]: recipe for recipe in recipes}
-        recipe_ids: List[int] = []
-        explain_map: Dict[int, List[str]] = {}
-
-        for entry in selected:
-            recipe_id = entry.get("recipe_id")
-            if recipe_id not in recipe_lookup:
-                continue
-            recipe_ids.append(recipe_id)
-            explain = entry.get("explain") or []
-            if not isinstance(explain, list):
-                explain = [str(explain)]
-            explain_map[recipe_id] = explain
-
-        if not recipe_ids:
-            raise ProviderNotAvailable("PROVIDER_RESPONSE_INVALID", "No valid recipe_id in selected list")
-
-        menu_id = f"menu_{uuid.uuid4().hex[:8]}"
-        db.insert_menu_plan(menu_id, days, servings, constraints)
-
-        plan_items = self._build_plan_items(
-            menu_id=menu_id,
-            recipe_ids=recipe_ids,
-            explain_map=explain_map,
-            recipes=recipe_lookup,
-            days=days,
-        )
-        db.insert_menu_plan_items(plan_items)
-
-        gap = self._calculate_gap(recipe_ids, recipe_map, inventory_map)
-        items_lookup = {item["item_id"]: item for item in db.list_items()}
-        shopping_items = self._build_shopping_items(menu_id, gap, items_lookup)
-        if shopping_items:
-            db.insert_shopping_items(shopping_items)
-
-        return {
-            "menu_id": menu_id,
-            "plan": plan_items,
-            "shopping_gap": shopping_items,
-            "llm_raw": llm_out,   # 便于调试
-        }
+        return selected
 
 
 def list_planners() -> Dict[str, object]:
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from collections import namedtuple
+from dataclasses import dataclass, fields
 from typing import Any, Dict, List, Optional
 
 
@@ -90,3 +91,29 @@ class ShoppingListItem:
     unit: str
     reason: Dict[str, Any]
     checked: bool
+
+
+@dataclass
+class HttpRequest:
+    """A provider call described as data, so sync (requests) and async (httpx) callers send the same thing."""
+
+    url: str
+    payload: Dict[str, Any]
+    headers: Optional[Dict[str, str]]
+    timeout: float
+
+
+def record_type(schema: type) -> type:
+    """Tuple-backed, immutable row type with the same fields as ``schema``.
+
+    Records cost a fraction of a ``dict(sqlite3.Row)`` per row, so bulk paths
+    (planners, exports) ask lib.db for them instead of dicts.
+    """
+    return namedtuple(f"{schema.__name__}Record", [field.name for field in fields(schema)])
+
+
+ItemRecord = record_type(Item)
+InventoryBatchRecord = record_type(InventoryBatch)
+InventoryEventRecord = record_type(InventoryEvent)
+RecipeRecord = record_type(Recipe)
+RecipeIngredientRecord = record_type(RecipeIngredient)
@@ -2,21 +2,41 @@ from __future__ import annotations
 
 import hashlib
 import json
+import os
+import threading
+import time
 from datetime import date, datetime, timedelta
 from typing import Any, Iterable
 
 DATE_FMT = "%Y-%m-%d"
 DATETIME_FMT = "%Y-%m-%d %H:%M:%S"
+EPOCH = date(1970, 1, 1)
+
+# Crockford base32: digits sort before letters in ASCII, so encoded ids sort like their integers.
+_ID_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_ID_RANDOM_BITS = 80
+_id_lock = threading.Lock()
+_id_last = (0, 0)
 
 
 def today() -> date:
     return date.today()
 
 
+def utc_today() -> date:
+    """Today's date in UTC, the calendar of now_ts() and the created_epoch columns."""
+    return datetime.utcnow().date()
+
+
 def now_ts() -> str:
     return datetime.utcnow().strftime(DATETIME_FMT)
 
 
+def ts_days_ago(days: int) -> str:
+    """The now_ts() timestamp ``days`` days back (UTC)."""
+    return (datetime.utcnow() - timedelta(days=days)).strftime(DATETIME_FMT)
+
+
 def parse_date(value: str | None) -> date | None:
     if not value:
         return None
@@ -29,6 +49,11 @@ def format_date(value: date | None) -> str | None:
     return value.strftime(DATE_FMT)
 
 
+def day_number(value: date) -> int:
+    """Days since 1970-01-01, matching the *_day columns."""
+    return (value - EPOCH).days
+
+
 def add_days(value: date, days: int) -> date:
     return value + timedelta(days=days)
 
@@ -43,6 +68,31 @@ def from_json(value: str | None, default: Any) -> Any:
     return json.loads(value)
 
 
+def new_id(prefix: str) -> str:
+    """``<prefix>_`` + a 26-char ULID: 48-bit millisecond time then 80 random bits.
+
+    Ids sort by creation time, and within one process they are strictly
+    increasing (same millisecond -> previous random part + 1), so inserts land
+    at the right edge of the primary-key index.
+    """
+    global _id_last
+    with _id_lock:
+        millis = max(time.time_ns() // 1_000_000, _id_last[0])
+        if millis == _id_last[0]:
+            rand = _id_last[1] + 1
+            if rand >> _ID_RANDOM_BITS:
+                millis, rand = millis + 1, int.from_bytes(os.urandom(10), "big")
+        else:
+            rand = int.from_bytes(os.urandom(10), "big")
+        _id_last = (millis, rand)
+    value = (millis << _ID_RANDOM_BITS) | rand
+    chars = []
+    for _ in range(26):
+        chars.append(_ID_ALPHABET[value & 31])
+        value >>= 5
+    return f"{prefix}_{''.join(reversed(chars))}"
+
+
 def stable_hash(value: str) -> int:
     return int(hashlib.sha256(value.encode("utf-8")).hexdigest(), 16) % (10**8)
 
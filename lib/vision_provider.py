@@ -7,6 +7,7 @@ import random
 from typing import Any, Dict, List
 import requests
 from . import db
+from .schemas import HttpRequest
 from .utils import add_days, format_date, stable_hash, today
 from functools import lru_cache
 from pathlib import Path
@@ -156,6 +157,20 @@ class HttpVisionProvider(BaseVisionProvider):
             raise ProviderNotAvailable("PROVIDER_CONFIG_ERROR", f"Invalid VISION_HTTP_HEADERS_JSON: {exc}") from exc
 
     def detect(self, image_id: str, top_k: int = 10) -> List[Dict[str, Any]]:
+        request = self.build_request(image_id, top_k)
+        response = requests.post(request.url, headers=request.headers, json=request.payload, timeout=request.timeout)
+        return self.parse_response(image_id, response.status_code, response.text)
+
+    def build_request(self, image_id: str, top_k: int) -> HttpRequest:
+        """The detection request for ``image_id``; send it with any HTTP client, then call parse_response."""
+        return HttpRequest(self.endpoint, self._request_payload(image_id, top_k), self._headers(), self.timeout)
+
+    def parse_response(self, image_id: str, status_code: int, text: str) -> List[Dict[str, Any]]:
+        if status_code >= 400:
+            raise RuntimeError(f"{status_code} {text[:200]}")
+        return self._normalize(image_id, json.loads(text))
+
+    def _request_payload(self, image_id: str, top_k: int) -> Dict[str, Any]:
         available, reason = self.is_available()
         if not available:
             raise ProviderNotAvailable("PROVIDER_NOT_AVAILABLE", reason)
@@ -167,15 +182,9 @@ class HttpVisionProvider(BaseVisionProvider):
             raise ProviderNotAvailable("IMAGE_NOT_FOUND", f"Image file missing for {image_id}")
         with open(file_path, "rb") as file_handle:
             image_base64 = base64.b64encode(file_handle.read()).decode("utf-8")
-        payload = {"image_id": image_id, "image_base64": image_base64, "top_k": top_k}
-        response = requests.post(
-            self.endpoint,
-            headers=self._headers(),
-            json=payload,
-            timeout=self.timeout,
-        )
-        response.raise_for_status()
-        data = response.json()
+        return {"image_id": image_id, "image_base64": image_base64, "top_k": top_k}
+
+    def _normalize(self, image_id: str, data: Dict[str, Any]) -> List[Dict[str, Any]]:
         detections = data.get("detections", [])
         items = {item["name"]: item for item in db.list_items()}
         normalized = []
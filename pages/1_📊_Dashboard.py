@@ -234,7 +234,7 @@ st.markdown("### 🥗 食材生命体征 (Live)")
 
 # 获取数据 (复用你现有的逻辑，但我们取更多数据来展示效果)
 # 注意：这里假设 inventory 包含 item_name_snapshot, days_left, unit, quantity
-expiring_data = api.list_expiring(days=10)["batches"] 
+expiring_data = api.list_expiring(days=10, limit=30)["batches"]
 
 def life_from_days(days_left: int) -> int:
     # 你可以换成更科学的映射：比如按“剩余/保质期总天数”
@@ -256,7 +256,7 @@ if expiring_data:
     # 准备 HTML 字符串
 
     nodes = []
-    for b in expiring_data[:30]:  # 可多展示点，D3会自己排开
+    for b in expiring_data:  # 可多展示点，D3会自己排开
         days = int(b.get("days_left", 0) or 0)
         name = b.get("item_name_snapshot", "未知")
         qty = float(b.get("quantity", 1) or 1)
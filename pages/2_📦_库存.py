@@ -7,6 +7,7 @@ import pandas as pd
 import streamlit as st
 
 from lib import api
+from lib.utils import day_number
 
 
 # =========================
@@ -287,14 +288,11 @@ LOCATION_ICONS = {"freezer": "🧊", "fridge": "❄️", "pantry": "🥫"}
 SOURCE_LABELS = {"manual": "手动", "vision": "识别", "recipe": "菜单", "import": "导入"}
 
 
-def _days_left(expire_date: Any) -> Optional[int]:
-    if not expire_date or pd.isna(expire_date):
-        return None
-    try:
-        d = date.fromisoformat(str(expire_date))
-        return (d - date.today()).days
-    except Exception:
+def _days_left(expire_day: Any) -> Optional[int]:
+    # expire_day 是数据库生成的整数天数（自 1970-01-01），直接相减，无需解析日期字符串
+    if expire_day is None or pd.isna(expire_day):
         return None
+    return int(expire_day) - day_number(date.today())
 
 
 def _freshness_badge(days_left: Optional[int]) -> Tuple[str, str]:
@@ -308,7 +306,7 @@ def _freshness_badge(days_left: Optional[int]) -> Tuple[str, str]:
 
 
 def _sort_key(batch: Dict[str, Any]) -> Tuple[int, int]:
-    dl = _days_left(batch.get("expire_date"))
+    dl = _days_left(batch.get("expire_day"))
     if dl is None:
         return (10_000, 0)
     return (max(-9999, dl), 0)
@@ -380,7 +378,36 @@ st.caption("提示：在「冰箱视图」点卡片的“查看详情”，右
 st.markdown("</div>", unsafe_allow_html=True)
 
 filters = {"location": location or None, "status": status or None, "keyword": keyword or None}
-response = api.list_batches(filters)
+
+# 分页：无关键词时按 (到期日, 批次) 游标逐页加载；关键词搜索只取最相关的一页
+PAGE_SIZE = 60
+PAGE_COLUMNS = [
+    "batch_id",
+    "item_name_snapshot",
+    "quantity",
+    "unit",
+    "expire_date",
+    "expire_day",
+    "location",
+    "status",
+    "source_type",
+]
+filter_key = (location, status, keyword)
+if st.session_state.get("page_filter_key") != filter_key:
+    st.session_state.page_filter_key = filter_key
+    st.session_state.page_cursors = [None]
+
+if keyword:
+    response = api.list_batches(filters, limit=PAGE_SIZE)
+    next_cursor = None
+else:
+    response = api.list_batches_page(
+        filters,
+        after=st.session_state.page_cursors[-1],
+        limit=PAGE_SIZE,
+        columns=PAGE_COLUMNS,
+    )
+    next_cursor = response.get("next")
 batches: List[Dict[str, Any]] = response.get("batches", []) or []
 
 if not batches:
@@ -388,29 +415,30 @@ if not batches:
     st.stop()
 
 # =========================
-# Prepare dataframe once
+# Prepare dataframe once (current page only)
 # =========================
 df = pd.DataFrame(batches)
 
-# quick metrics
-in_stock = df[df["status"] == "in_stock"]
-expiring_soon = 0
-expired = 0
-unknown = 0
-for _, r in in_stock.iterrows():
-    dl = _days_left(r.get("expire_date"))
-    if dl is None:
-        unknown += 1
-    elif dl < 0:
-        expired += 1
-    elif dl <= 3:
-        expiring_soon += 1
-
+# quick metrics（全库在库批次，来自计数器，不随分页变化）
+metrics = api.inventory_metrics()
 m1, m2, m3, m4 = st.columns(4)
-m1.metric("在库批次", int(in_stock.shape[0]))
-m2.metric("临期(≤3天)", int(expiring_soon))
-m3.metric("已过期", int(expired))
-m4.metric("到期未知", int(unknown))
+m1.metric("在库批次", int(metrics.get("in_stock", 0)))
+m2.metric("临期(≤3天)", int(metrics.get("expiring_soon", 0)))
+m3.metric("已过期", int(metrics.get("expired", 0)))
+m4.metric("到期未知", int(metrics.get("unknown_expiry", 0)))
+
+page_no = len(st.session_state.page_cursors)
+p1, p2, p3 = st.columns([1, 1, 4], gap="small")
+if p1.button("上一页", disabled=page_no <= 1, use_container_width=True):
+    st.session_state.page_cursors.pop()
+    st.rerun()
+if p2.button("下一页", disabled=next_cursor is None, use_container_width=True):
+    st.session_state.page_cursors.append(next_cursor)
+    st.rerun()
+if keyword:
+    p3.caption(f"按匹配度显示前 {len(batches)} 个批次")
+else:
+    p3.caption(f"第 {page_no} 页 · 本页 {len(batches)} 个批次")
 
 st.write("")
 
@@ -445,8 +473,10 @@ with main_col:
                 loc = "unknown"
             groups[loc].append(b)
 
-        for k in groups:
-            groups[k].sort(key=_sort_key)
+        # 关键词搜索时保留匹配度排序（完全匹配 > 前缀 > 包含），否则按临期排序
+        if not keyword:
+            for k in groups:
+                groups[k].sort(key=_sort_key)
 
         def shelf_section(loc_key: str, title: str, items: List[Dict[str, Any]]):
             st.markdown(
@@ -471,7 +501,7 @@ with main_col:
             for idx, b in enumerate(items):
                 c = cols[idx % 3]
                 with c:
-                    dl = _days_left(b.get("expire_date"))
+                    dl = _days_left(b.get("expire_day"))
                     badge_text, badge_cls = _freshness_badge(dl)
                     badge_html = _render_badge(badge_text, badge_cls)
                     expiring_tag = ""
@@ -541,7 +571,7 @@ with main_col:
                 "source_type",
             ]
         ].copy()
-        display_df["临期标签"] = display_df["expire_date"].apply(
+        display_df["临期标签"] = df["expire_day"].apply(
             lambda x: "临期" if (_days_left(x) is not None and _days_left(x) <= 3) else ""
         )
         display_df.rename(
@@ -567,18 +597,12 @@ with main_col:
         )
 
         if st.button("保存编辑", type="primary"):
-            for _, row in edited.iterrows():
-                original = df[df["batch_id"] == row["批次"]].iloc[0]
-                patch: Dict[str, Any] = {}
-                if row["数量"] != original["quantity"]:
-                    patch["quantity"] = float(row["数量"])
-                if row["到期日"] != original["expire_date"]:
-                    patch["expire_date"] = row["到期日"]
-                if row["位置"] != original["location"]:
-                    patch["location"] = row["位置"]
-                if patch:
-                    api.update_batch(original["batch_id"], patch)
-            st.success("已保存批次更新 ✅")
+            # 整表交给 API 按批次号比对，变更与调整事件在一个事务里写入
+            edits = edited.rename(
+                columns={"批次": "batch_id", "数量": "quantity", "到期日": "expire_date", "位置": "location"}
+            )[["batch_id", "quantity", "expire_date", "location"]].to_dict("records")
+            summary = api.apply_batch_edits(edits)
+            st.success(f"已保存批次更新 ✅（{summary['updated']} 个批次有变更）")
 
         st.write("")
         batch_ids = [b["batch_id"] for b in batches]
@@ -627,7 +651,7 @@ with detail_col:
     qty = float(selected_row.get("quantity") or 0.0)
     unit = selected_row.get("unit") or ""
     expire = selected_row.get("expire_date")
-    dl = _days_left(expire)
+    dl = _days_left(selected_row.get("expire_day"))
     badge_text, badge_cls = _freshness_badge(dl)
 
     st.markdown(
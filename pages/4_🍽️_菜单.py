@@ -168,6 +168,13 @@ if st.session_state.last_menu_id:
     menu = api.get_menu(st.session_state.last_menu_id)
     recipes = {r["recipe_id"]: r for r in db.list_recipes()}
     st.markdown("### 菜单计划")
+    # 每日热量由数据库按 calories 列汇总，不需要逐条解析营养 JSON
+    calories = api.get_menu_calories(st.session_state.last_menu_id)
+    if calories["total"]:
+        day_chips = "".join(
+            f"<span class='chip'>{day['date']} · {day['calories'] or 0:g} kcal</span>" for day in calories["days"]
+        )
+        md_html(f"<div class='chips'>{day_chips}<span class='chip'>合计 {calories['total']:g} kcal</span></div>")
     for item in menu.get("items", []):
         recipe = recipes.get(item["recipe_id"], {"name": "未知菜谱"})
         reasons = item.get("explain", []) or []
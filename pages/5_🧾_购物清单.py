@@ -81,7 +81,7 @@ md_html(
 if "last_menu_id" not in st.session_state:
     st.session_state.last_menu_id = None
 
-menu_ids = [row["menu_id"] for row in db.fetch_all("SELECT menu_id FROM menu_plans ORDER BY generated_at DESC")]
+menu_ids = db.list_menu_ids()
 if menu_ids:
     selected_menu = st.selectbox("选择菜单计划", options=menu_ids, index=0)
 else:
@@ -135,19 +135,19 @@ if selected_menu:
 
         b1, b2, b3 = st.columns([1.2, 1.2, 1], gap="small")
         if b1.button("全部标记已购买"):
-            for item_id in df["id"].tolist():
-                api.update_shopping_item_checked(item_id, True)
+            api.set_shopping_items_checked(selected_menu, None, True)
             st.success("已全部标记为已购买")
             st.rerun()
         if b2.button("全部取消"):
-            for item_id in df["id"].tolist():
-                api.update_shopping_item_checked(item_id, False)
+            api.set_shopping_items_checked(selected_menu, None, False)
             st.success("已全部取消")
             st.rerun()
         if b3.button("保存勾选状态", type="primary"):
-            for _, row in edited.iterrows():
-                api.update_shopping_item_checked(row["item_id"], bool(row["已购买"]))
-            st.success("已更新购物清单状态")
+            # 勾选的行就是该菜单全部已购买项，一次事务写入；新增的空行没有 item_id，跳过
+            saved = edited.dropna(subset=["item_id"])
+            checked_ids = saved.loc[saved["已购买"].fillna(False).astype(bool), "item_id"].tolist()
+            changed = api.set_shopping_items_checked_state(selected_menu, checked_ids)["changed"]
+            st.success(f"已更新购物清单状态（{changed} 项变更）")
 
         export_df = edited.copy()
         export_df["exported_at"] = pd.Timestamp.now().isoformat(timespec="seconds")
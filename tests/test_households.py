@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from lib import api, db
+
+
+class HouseholdEvictionTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self._saved = (db.DB_PATH, db.MAX_OPEN_DATABASES)
+        db.DB_PATH = Path(self._tmp.name) / "test.db"
+        db.MAX_OPEN_DATABASES = 2
+
+    def tearDown(self) -> None:
+        db.close_all()
+        db._initialized.clear()
+        db.DB_PATH, db.MAX_OPEN_DATABASES = self._saved
+        self._tmp.cleanup()
+
+    def test_busy_household_is_not_evicted(self) -> None:
+        def open_household(name: str) -> None:
+            with api.household(name):
+                api.ensure_initialized()
+
+        with api.household("busy"):
+            api.ensure_initialized()
+            with db.transaction() as conn:
+                conn.execute("INSERT INTO items(name, default_unit) VALUES ('milk', 'ml')")
+                for name in ("a", "b", "c"):
+                    opener = threading.Thread(target=open_household, args=(name,))
+                    opener.start()
+                    opener.join()
+                self.assertIn(db.current_path(), db._writers)
+                self.assertIn((db.current_path(), False), db._pools)
+            self.assertEqual(len(db.list_items()), 1)
+
+    def test_concurrent_households_under_eviction(self) -> None:
+        errors = []
+
+        def session(household_id: str) -> None:
+            try:
+                with api.household(household_id):
+                    for i in range(20):
+                        api.bulk_create_batches({"type": "manual"}, [{"item_name": f"{household_id}-{i}", "quantity": 1}])
+                        api.list_batches({}, limit=5)
+                        db.list_items()
+            except Exception as exc:  # noqa: BLE001
+                errors.append(exc)
+
+        threads = [threading.Thread(target=session, args=(f"h{i}",)) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        for i in range(6):
+            with api.household(f"h{i}"):
+                self.assertEqual(len(api.list_batches({})["batches"]), 20)
+        self.assertLessEqual(len(db._writers), db.MAX_OPEN_DATABASES)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from lib import db
+
+
+class QueryCacheEvictionTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self._db_path = db.DB_PATH
+        db.DB_PATH = Path(self._tmp.name) / "test.db"
+        db.init_db()
+        db.insert_items([{"name": "milk", "default_unit": "ml"}])
+
+    def tearDown(self) -> None:
+        db.close_all()
+        db._initialized.clear()
+        db.DB_PATH = self._db_path
+        self._tmp.cleanup()
+
+    def test_commit_after_forget_then_cached_read(self) -> None:
+        path = db.current_path()
+        self.assertEqual(len(db.list_items()), 1)
+        db._query_cache.forget(path)
+        db._query_cache.committed(path, ["items"])
+        self.assertEqual(len(db.list_items()), 1)
+
+    def test_forget_never_revives_an_older_entry(self) -> None:
+        path = db.current_path()
+        stale = db._query_cache.stamp(path)
+        query = "SELECT * FROM items"
+        db._query_cache.forget(path)
+        # A reader that stamped before the eviction stores its result afterwards.
+        db._query_cache.put(path, query, (), ("items",), stale, [{"name": "stale"}])
+        db.insert_items([{"name": "eggs", "default_unit": "unit"}])
+        fresh = db._query_cache.stamp(path)
+        self.assertIsNone(db._query_cache.get(path, query, (), ("items",), fresh))
+        self.assertEqual(sorted(row["name"] for row in db.list_items()), ["eggs", "milk"])
+
+    def test_eviction_between_write_and_read(self) -> None:
+        self.assertEqual(len(db.list_items()), 1)
+        db._query_cache.forget(db.current_path())
+        db.insert_items([{"name": "eggs", "default_unit": "unit"}])
+        self.assertEqual(len(db.list_items()), 2)
+        db.insert_items([{"name": "rice", "default_unit": "g"}])
+        self.assertEqual(len(db.list_items()), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()